@@ -0,0 +1,102 @@
+# Helper functions shared by the benchmark scripts
+# Run the benchmarks from the root folder, e.g. `python benchmarks/precision.py`
+
+import time
+import torch
+import torch.nn.functional as F
+import numpy as np
+
+# Architectures used by the experiments in `experiments/` (plus the VGG16 extractor of `examples/imagenet-224x224.py`)
+# (num_ftrs, NUM_CLASSES, hidden_layers, fc_neurons), same arguments as `ModelUtils.getPcModelArchitecture()`
+EXPERIMENT_ARCHITECTURES = {
+    'resnet152_default': (2048, 50, 2, 256),
+    'resnet152_vary_fc_neurons': (2048, 50, 2, 1024),
+    'resnet152_vary_depth': (2048, 50, 6, 256),
+    'vgg16': (512*7*7, 50, 2, 2048)
+}
+
+def getArchitecture(name):
+    """Returns the list of layer sizes (PcTorch `neurons` argument) of an architecture in `EXPERIMENT_ARCHITECTURES`
+    """
+    input_size, output_size, num_layers, neurons_hidden_layer = EXPERIMENT_ARCHITECTURES[name]
+    neurons = [input_size]
+    for i in range(num_layers-1):
+        neurons.append(neurons_hidden_layer)
+
+    neurons.append(output_size)
+
+    return neurons
+
+def getSyntheticDataset(num_samples, input_size, num_classes, seed=0):
+    """Creates a random classification dataset of feature vectors in the range (0..1), similar to normalized extractor features (and valid inputs for the sigmoid preprocessing)
+
+        Args:
+            num_samples: number of samples
+            input_size: size of each feature vector
+            num_classes: number of classes
+            seed: random seed
+
+        Returns: 
+            - Features, a torch array with shape [num_samples, input_size]
+            - Labels, a torch array of class indices with shape [num_samples]
+    """
+    generator = torch.Generator().manual_seed(seed)
+    features = torch.sigmoid(torch.randn(num_samples, input_size, generator=generator))
+    teacher = torch.randn(input_size, num_classes, generator=generator)
+    labels = torch.argmax(torch.matmul(features - 0.5, teacher), dim=1)
+
+    return features, labels
+
+def getBatches(features, labels, batch_size):
+    """Splits a dataset into a list of (features, labels) batches, dropping the last incomplete batch
+    """
+    n_batches = features.shape[0] // batch_size
+    return [
+        (features[i*batch_size:(i+1)*batch_size], labels[i*batch_size:(i+1)*batch_size])
+        for i in range(n_batches)
+    ]
+
+def trainPcModel(pc_model, batches, num_classes, epochs=1):
+    """Trains a PcTorch model (already configured with `set_training_parameters()`) with `single_batch_pass()`
+
+        Returns: 
+            - Average time (seconds) per training batch
+    """
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        for features, labels in batches:
+            labels_one_hot = F.one_hot(labels, num_classes=num_classes)
+            pc_model.single_batch_pass(features, labels_one_hot)
+
+    return (time.perf_counter() - start) / (epochs*len(batches))
+
+def evaluatePcModel(pc_model, batches):
+    """Calculates the accuracy of a PcTorch model with `batch_inference()`
+    """
+    correct = 0
+    total = 0
+    for features, labels in batches:
+        prediction = pc_model.batch_inference(features)
+        correct += (torch.argmax(prediction, dim=0).cpu() == labels).sum().item()
+        total += labels.shape[0]
+
+    return correct*1.0/total
+
+def timeFunction(function, repeat=10, warmup=2):
+    """Measures the execution time of `function` (called without arguments)
+
+        Returns: 
+            - Median time (seconds) of a single call
+    """
+    for i in range(warmup):
+        function()
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+
+    return float(np.median(times))
@@ -0,0 +1,68 @@
+# Verifies that the PcTorch inference iterations do not allocate tensors once the workspace exists:
+# the allocations of an inference call, counted with util.count_allocations(), must not grow with the number of iterations
+# Run from the root folder: python -W ignore benchmarks/allocations.py
+
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+from snn import util
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURE = 'resnet152_vary_depth'
+TRAIN_BATCH_SIZE = 32
+MAX_ITERATIONS = [10, 40]
+
+# Inference settings measured (see `PcTorch.get_workspace()` for the settings that still allocate)
+SETTINGS = {
+    'default': {},
+    'stacked': {'stacked_inference': True},
+    'gauss_seidel_up': {'update_order': 'gauss_seidel_up'},
+    'red_black': {'update_order': 'red_black'},
+    'momentum': {'solver': 'momentum'},
+    'adaptive': {'solver': 'adaptive'},
+    'per_sample_rate': {'solver': 'per_sample'},
+    'residual': {'residual_tolerance': 1e-9},
+    'sync_free': {'sync_free_inference': True},
+    'per_sample': {'per_sample_convergence': True},
+    'anderson': {'solver': 'anderson'},
+    'incremental': {'incremental_update_interval': 5},
+    'torchscript': {'inference_backend': 'torchscript'},
+}
+
+neurons = BenchUtils.getArchitecture(ARCHITECTURE)
+num_classes = neurons[-1]
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE, neurons[0], num_classes)
+labels_one_hot = F.one_hot(labels, num_classes=num_classes)
+
+def measure(settings, max_it):
+    pc_model = PcTorch(neurons, precision='float32')
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, max_it, 'sigmoid', 'adam', 0.001, 0.9, **settings)
+    pc_model.min_inference_error = 0 # always run max_it iterations
+
+    # First batch creates the workspace
+    pc_model.single_batch_pass(features, labels_one_hot)
+    buffers = pc_model.workspace_allocations
+
+    x = pc_model.feedforward(pc_model.preprocessing(features.to(pc_model.compute_dtype).t()).to(PcTorch.device))
+    x[len(neurons)-1] = labels_one_hot.t().to(PcTorch.device, dtype=pc_model.compute_dtype)
+    inference, _ = util.count_allocations(lambda: pc_model.inference(x, copy=False))
+    batch, _ = util.count_allocations(lambda: pc_model.single_batch_pass(features, labels_one_hot))
+    return inference, batch, pc_model.workspace_allocations - buffers
+
+print(f"Architecture: {ARCHITECTURE} {neurons}")
+for name, settings in SETTINGS.items():
+    inference = []
+    batch = []
+    buffers = 0
+    for max_it in MAX_ITERATIONS:
+        allocations = measure(settings, max_it)
+        inference.append(allocations[0])
+        batch.append(allocations[1])
+        buffers += allocations[2]
+
+    per_iteration = (inference[-1] - inference[0])/(MAX_ITERATIONS[-1] - MAX_ITERATIONS[0])
+    print('%15s | inference allocations (max_it %s): %s | batch allocations: %s | per iteration: %5.2f | new workspace buffers: %d' %
+        (name, MAX_ITERATIONS, inference, batch, per_iteration, buffers))
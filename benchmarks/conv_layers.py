@@ -0,0 +1,72 @@
+# Spatial predictive coding layers (`snn/layers.py`) on the VGG16 feature maps (512x7x7), compared with
+# the dense network on the flattened features: parameters, training time per batch and accuracy.
+# The spatial connections are first checked against pytorch: predictions against conv2d/avg_pool2d,
+# error feedback as the adjoint of the prediction, and weight gradients against autograd
+# Run from the root folder: python -W ignore benchmarks/conv_layers.py
+
+import torch
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+from snn import layers
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+IN_SHAPE = (512, 7, 7) # VGG16 feature maps
+NUM_CLASSES = 50
+FC_NEURONS = 2048
+CONV_CHANNELS = 64
+TRAIN_BATCH_SIZE = 32
+TRAIN_BATCHES = 60
+TEST_BATCHES = 10
+EPOCHS = 2
+PRECISION = 'float32'
+
+def checkConnection(connection, w, batch_size=4):
+    fx = torch.rand(connection.in_neurons, batch_size, dtype=torch.float64, device=PcTorch.device)
+    e = torch.randn(connection.out_neurons, batch_size, dtype=torch.float64, device=PcTorch.device)
+    maps = layers.to_maps(fx, connection.in_shape)
+
+    if isinstance(connection, layers.Conv2d):
+        kernels = w.reshape(connection.out_shape[0], connection.in_shape[0], connection.kernel_size, connection.kernel_size)
+        expected = F.conv2d(maps, kernels, stride=connection.stride, padding=connection.padding)
+    else:
+        expected = F.avg_pool2d(maps, connection.kernel_size, stride=connection.stride)
+    assert torch.allclose(connection.predict(w, fx), layers.to_columns(expected))
+
+    # <feedback(e), fx> == <e, predict(fx)>
+    assert torch.allclose(torch.sum(connection.feedback(w, e)*fx), torch.sum(e*connection.predict(w, fx)))
+
+    if w.numel() > 0:
+        w_grad = w.clone().requires_grad_()
+        torch.sum(e*connection.predict(w_grad, fx)).backward()
+        assert torch.allclose(connection.gradient(e, fx, torch.empty_like(w)), w_grad.grad)
+
+conv = layers.Conv2d(IN_SHAPE, CONV_CHANNELS, 3, padding=1)
+pool = layers.AvgPool2d(conv.out_shape, 7)
+checkConnection(conv, torch.randn(*conv.weight_shape, dtype=torch.float64, device=PcTorch.device))
+checkConnection(layers.Conv2d(IN_SHAPE, 8, 3, stride=2), torch.randn(8, IN_SHAPE[0]*9, dtype=torch.float64, device=PcTorch.device))
+checkConnection(pool, torch.empty(0, dtype=torch.float64, device=PcTorch.device))
+print("Spatial connections match pytorch")
+
+input_size = IN_SHAPE[0]*IN_SHAPE[1]*IN_SHAPE[2]
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*(TRAIN_BATCHES+TEST_BATCHES), input_size, NUM_CLASSES)
+batches = BenchUtils.getBatches(features, labels, TRAIN_BATCH_SIZE)
+train_batches, test_batches = batches[:TRAIN_BATCHES], batches[TRAIN_BATCHES:]
+
+spatial_neurons, spatial_layers = layers.neurons(IN_SHAPE, [conv, pool], [FC_NEURONS, NUM_CLASSES])
+models = {
+    'dense': PcTorch([input_size, FC_NEURONS, NUM_CLASSES], precision=PRECISION),
+    'conv3x3 + avgpool': PcTorch(spatial_neurons, precision=PRECISION, layers=spatial_layers)
+}
+
+for name, pc_model in models.items():
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+    parameters = sum(pc_model.w[l].numel() + pc_model.b[l].numel() for l in range(pc_model.n_layers-1))
+
+    train_time = BenchUtils.trainPcModel(pc_model, train_batches, NUM_CLASSES, epochs=EPOCHS)
+    accuracy = BenchUtils.evaluatePcModel(pc_model, test_batches)
+
+    print('%18s | neurons: %28s | parameters: %9d | train batch: %8.2fms | accuracy: %.3f' % (name, pc_model.neurons, parameters, train_time*1000, accuracy))
@@ -0,0 +1,46 @@
+# Compares the iterative PcTorch inference with the fixed prediction (backprop equivalent) inference
+# on training time per batch and accuracy, using a synthetic feature dataset
+# Run from the root folder: python -W ignore benchmarks/fixed_prediction.py
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = ['resnet152_default', 'resnet152_vary_depth']
+TRAIN_BATCH_SIZE = 32
+INFERENCE_STEPS = 40
+TRAIN_SAMPLES = 2048
+VALID_SAMPLES = 512
+EPOCHS = 3
+PRECISION = 'float32'
+
+for architecture in ARCHITECTURES:
+    neurons = BenchUtils.getArchitecture(architecture)
+    num_classes = neurons[-1]
+
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_SAMPLES + VALID_SAMPLES, neurons[0], num_classes)
+    train_batches = BenchUtils.getBatches(features[:TRAIN_SAMPLES], labels[:TRAIN_SAMPLES], TRAIN_BATCH_SIZE)
+    valid_batches = BenchUtils.getBatches(features[TRAIN_SAMPLES:], labels[TRAIN_SAMPLES:], TRAIN_BATCH_SIZE)
+
+    print(f"Architecture: {architecture} {neurons}")
+    for fixed_prediction in [False, True]:
+        pc_model = PcTorch(neurons, precision=PRECISION)
+        pc_model.set_training_parameters(
+            TRAIN_BATCH_SIZE,
+            INFERENCE_STEPS, 
+            'sigmoid', 
+            'adam', 
+            0.001,
+            0.9,
+            fixed_prediction=fixed_prediction)
+
+        time_per_batch = BenchUtils.trainPcModel(pc_model, train_batches, num_classes, EPOCHS)
+        valid_accuracy = BenchUtils.evaluatePcModel(pc_model, valid_batches)
+
+        mode = 'fixed prediction' if fixed_prediction else 'iterative'
+        print('inference: %16s | steps (last batch): %2d | time/batch: %.4fs | val acc: %.3f' % 
+            (mode, pc_model.inference_steps, time_per_batch, valid_accuracy))
+
+    print("------------------------------------------------\n")
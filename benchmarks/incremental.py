@@ -0,0 +1,61 @@
+# Compares the time-to-accuracy of the normal PcTorch training schedule (weight update after inference)
+# with incremental predictive coding (weight updates every k inference iterations), using the
+# network of `examples/imagenet-64x64.py` (reduced dataset) on synthetic features
+# Run from the root folder: python -W ignore benchmarks/incremental.py
+
+import time
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters (network of examples/imagenet-64x64.py with USE_REDUCED_DATASET)
+NEURONS = [2048, 512, 20]
+UPDATE_INTERVALS = [0, 1, 5, 10] # 0: normal schedule
+TRAIN_BATCH_SIZE = 32
+INFERENCE_STEPS = 40
+TRAIN_SAMPLES = 4096
+VALID_SAMPLES = 1024
+EPOCHS = 8
+TARGET_ACCURACY = 0.5
+PRECISION = 'float32'
+
+num_classes = NEURONS[-1]
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_SAMPLES + VALID_SAMPLES, NEURONS[0], num_classes)
+train_batches = BenchUtils.getBatches(features[:TRAIN_SAMPLES], labels[:TRAIN_SAMPLES], TRAIN_BATCH_SIZE)
+valid_batches = BenchUtils.getBatches(features[TRAIN_SAMPLES:], labels[TRAIN_SAMPLES:], TRAIN_BATCH_SIZE)
+
+print(f"Architecture: {NEURONS}, target accuracy: {TARGET_ACCURACY}")
+for interval in UPDATE_INTERVALS:
+    pc_model = PcTorch(NEURONS, precision=PRECISION)
+    pc_model.set_training_parameters(
+        TRAIN_BATCH_SIZE,
+        INFERENCE_STEPS, 
+        'relu', 
+        'sgd', 
+        0.003,
+        0.9,
+        incremental_update_interval=interval)
+
+    training_time = 0
+    time_to_accuracy = None
+    for epoch in range(EPOCHS):
+        pc_model.total_inference_steps = 0
+        start = time.perf_counter()
+        BenchUtils.trainPcModel(pc_model, train_batches, num_classes)
+        training_time += time.perf_counter() - start
+
+        valid_accuracy = BenchUtils.evaluatePcModel(pc_model, valid_batches)
+        if time_to_accuracy is None and valid_accuracy >= TARGET_ACCURACY:
+            time_to_accuracy = training_time
+
+        print('interval: %2d | epoch: %d | training time: %7.2fs | inference iterations: %6d | val acc: %.3f' % 
+            (interval, epoch+1, training_time, pc_model.total_inference_steps, valid_accuracy))
+
+    if time_to_accuracy is None:
+        print(f"interval: {interval:2d} | target accuracy not reached")
+    else:
+        print(f"interval: {interval:2d} | time to accuracy: {time_to_accuracy:.2f}s")
+
+    print("------------------------------------------------\n")
@@ -0,0 +1,47 @@
+# Compares the eager and compiled (TorchScript, torch.compile) PcTorch inference backends
+# in inference iterations per second, for the architectures of `experiments/`
+# Run from the root folder: python -W ignore benchmarks/inference_backends.py
+
+import torch
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = ['resnet152_default', 'resnet152_vary_fc_neurons', 'resnet152_vary_depth']
+BACKENDS = ['eager', 'torchscript', 'compile']
+TRAIN_BATCH_SIZE = 32
+INFERENCE_STEPS = 40
+PRECISION = 'float32'
+
+print("CPU threads:", torch.get_num_threads())
+
+for architecture in ARCHITECTURES:
+    neurons = BenchUtils.getArchitecture(architecture)
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE, neurons[0], num_classes)
+
+    print(f"Architecture: {architecture} {neurons}")
+    for backend in BACKENDS:
+        pc_model = PcTorch(neurons, precision=PRECISION)
+        pc_model.set_training_parameters(
+            TRAIN_BATCH_SIZE,
+            INFERENCE_STEPS, 
+            'sigmoid', 
+            'adam', 
+            0.001,
+            0.9,
+            sync_free_inference=True,
+            inference_backend=backend)
+
+        # Feedforward once, every timed call relaxes a copy of the same states
+        x0 = pc_model.feedforward(pc_model.preprocessing(features.to(pc_model.compute_dtype).t()).to(PcTorch.device))
+        x0[len(neurons)-1] = F.one_hot(labels, num_classes=num_classes).t().to(PcTorch.device, dtype=pc_model.compute_dtype)
+
+        seconds = BenchUtils.timeFunction(lambda: pc_model.inference(dict(x0), copy=False), repeat=10, warmup=3)
+        print('backend: %11s | iterations/s: %9.1f' % (backend, INFERENCE_STEPS/seconds))
+
+    print("------------------------------------------------\n")
@@ -0,0 +1,45 @@
+# Compares the total inference iterations per epoch of the global update rate (default inference)
+# and of the per-sample adaptive update rates, using a synthetic feature dataset
+# Run from the root folder: python -W ignore benchmarks/inference_iterations.py
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURE = 'resnet152_default'
+SOLVERS = ['gd', 'per_sample']
+TRAIN_BATCH_SIZE = 32
+INFERENCE_STEPS = 40
+TRAIN_SAMPLES = 2048
+VALID_SAMPLES = 512
+EPOCHS = 3
+PRECISION = 'float32'
+
+neurons = BenchUtils.getArchitecture(ARCHITECTURE)
+num_classes = neurons[-1]
+
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_SAMPLES + VALID_SAMPLES, neurons[0], num_classes)
+train_batches = BenchUtils.getBatches(features[:TRAIN_SAMPLES], labels[:TRAIN_SAMPLES], TRAIN_BATCH_SIZE)
+valid_batches = BenchUtils.getBatches(features[TRAIN_SAMPLES:], labels[TRAIN_SAMPLES:], TRAIN_BATCH_SIZE)
+
+print(f"Architecture: {ARCHITECTURE} {neurons}")
+for solver in SOLVERS:
+    pc_model = PcTorch(neurons, precision=PRECISION)
+    pc_model.set_training_parameters(
+        TRAIN_BATCH_SIZE,
+        INFERENCE_STEPS, 
+        'sigmoid', 
+        'adam', 
+        0.001,
+        0.9,
+        solver=solver)
+
+    for epoch in range(EPOCHS):
+        pc_model.total_inference_steps = 0
+        time_per_batch = BenchUtils.trainPcModel(pc_model, train_batches, num_classes)
+        valid_accuracy = BenchUtils.evaluatePcModel(pc_model, valid_batches)
+
+        print('solver: %10s | epoch: %d | inference iterations: %6d | time/batch: %.4fs | val acc: %.3f' % 
+            (solver, epoch+1, pc_model.total_inference_steps, time_per_batch, valid_accuracy))
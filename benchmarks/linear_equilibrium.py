@@ -0,0 +1,55 @@
+# Verifies that the closed-form inference of linear-activation networks (direct and conjugate gradient solvers)
+# matches the converged iterative inference, and compares their time
+# Run from the root folder: python -W ignore benchmarks/linear_equilibrium.py
+
+import time
+import torch
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = [[256, 128, 128, 10], [2048, 256, 256, 256, 50]]
+TRAIN_BATCH_SIZE = 32
+ITERATIVE_STEPS = 20000
+TOLERANCE = 0.00001
+
+def relax(pc_model, data, targets):
+    x = pc_model.feedforward(data)
+    x[pc_model.n_layers-1] = targets
+    start = time.perf_counter()
+    x, e = pc_model.inference(x)
+    seconds = time.perf_counter() - start
+    return {l:torch.clone(x[l]) for l in x}, seconds
+
+for neurons in ARCHITECTURES:
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE, neurons[0], num_classes)
+
+    pc_model = PcTorch(neurons, precision='float64')
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, ITERATIVE_STEPS, 'linear', 'none', 0.001, 0.9)
+    data = pc_model.preprocessing(features.to(pc_model.compute_dtype).t()).to(PcTorch.device)
+    targets = F.one_hot(labels, num_classes=num_classes).t().to(PcTorch.device, dtype=pc_model.compute_dtype)
+
+    # Iterative reference, run to convergence
+    pc_model.closed_form_linear = False
+    pc_model.min_inference_error = 1e-20
+    x_iterative, iterative_time = relax(pc_model, data, targets)
+    iterative_steps = pc_model.inference_steps
+
+    print(f"Architecture: {neurons}")
+    print('solver: %9s | steps: %5d | time: %.4fs' % ('iterative', iterative_steps, iterative_time))
+
+    pc_model.closed_form_linear = True
+    for solver, max_neurons in [('direct', sum(neurons)), ('cg', 0)]:
+        pc_model.direct_solver_max_neurons = max_neurons
+        x_closed, closed_time = relax(pc_model, data, targets)
+
+        difference = max(torch.max(torch.abs(x_closed[l] - x_iterative[l])).item() for l in range(1, len(neurons)-1))
+        print('solver: %9s | max difference: %.2e | time: %.4fs' % (solver, difference, closed_time))
+        assert difference < TOLERANCE, f"Closed-form ({solver}) equilibrium does not match the iterative inference"
+
+    print("------------------------------------------------\n")
@@ -0,0 +1,43 @@
+# Compares the dense input layer with the factorised input layer w[0] = U·V (`PcTorch(neurons, input_rank=r)`)
+# for the 25088-wide VGG16 features: parameters, input projection time, training time per batch and accuracy
+# Run from the root folder: python -W ignore benchmarks/low_rank_input.py
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURE = 'vgg16'
+RANKS = [None, 256, 128, 64, 32] # None: dense input layer
+TRAIN_BATCH_SIZE = 32
+TRAIN_BATCHES = 60
+TEST_BATCHES = 10
+EPOCHS = 2
+PRECISION = 'float32'
+
+neurons = BenchUtils.getArchitecture(ARCHITECTURE)
+num_classes = neurons[-1]
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*(TRAIN_BATCHES+TEST_BATCHES), neurons[0], num_classes)
+batches = BenchUtils.getBatches(features, labels, TRAIN_BATCH_SIZE)
+train_batches, test_batches = batches[:TRAIN_BATCHES], batches[TRAIN_BATCHES:]
+
+print(f"Architecture: {ARCHITECTURE} {neurons}")
+for rank in RANKS:
+    pc_model = PcTorch(neurons, precision=PRECISION, input_rank=rank)
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+
+    if rank is None:
+        parameters = pc_model.w[0].numel()
+    else:
+        parameters = pc_model.w_u.numel() + pc_model.w_v.numel()
+
+    test_features, _ = test_batches[0]
+    data = pc_model.preprocessing(test_features.to(pc_model.compute_dtype).t()).to(PcTorch.device)
+    projection_time = BenchUtils.timeFunction(lambda: pc_model.input_product(pc_model.F(data)))
+
+    train_time = BenchUtils.trainPcModel(pc_model, train_batches, num_classes, epochs=EPOCHS)
+    accuracy = BenchUtils.evaluatePcModel(pc_model, test_batches)
+
+    print('rank: %5s | input layer parameters: %9d | input projection: %7.3fms | train batch: %8.2fms | accuracy: %.3f' % (
+        'dense' if rank is None else rank, parameters, projection_time*1000, train_time*1000, accuracy))
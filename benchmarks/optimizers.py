@@ -0,0 +1,36 @@
+# Measures the time of a single PcTorch optimizer step (all layers), for the 2048-wide (ResNet152)
+# and 25088-wide (VGG16) input layers
+# Run from the root folder: python -W ignore benchmarks/optimizers.py
+
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+INPUT_SIZES = [2048, 512*7*7]
+NUM_CLASSES = 50
+FC_NEURONS = 2048
+PRECISION = 'float32'
+
+for input_size in INPUT_SIZES:
+    neurons = [input_size, FC_NEURONS, NUM_CLASSES]
+    print(f"Architecture: {neurons}")
+
+    for optimizer in PcTorch.Optimizers:
+        pc_model = PcTorch(neurons, precision=PRECISION)
+        pc_model.set_training_parameters(32, 40, 'sigmoid', optimizer, 0.001, 0.9)
+
+        layers = range(pc_model.n_layers-1)
+        weights = [pc_model.w[l] for l in layers]
+        biases = [pc_model.b[l] for l in layers]
+        dw = [torch.randn_like(w, dtype=pc_model.compute_dtype)*0.001 for w in weights]
+        db = [torch.randn_like(b, dtype=pc_model.compute_dtype)*0.001 for b in biases]
+
+        # The optimizers do not modify the gradients: every timed step uses the same values
+        seconds = BenchUtils.timeFunction(lambda: pc_model.pc_optimizer.step(weights, biases, dw, db), repeat=20, warmup=3)
+        print('optimizer: %9s | step time: %8.3f ms' % (optimizer, seconds*1000))
+
+    print("------------------------------------------------\n")
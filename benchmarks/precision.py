@@ -0,0 +1,48 @@
+# Compares the PcTorch numeric precision modes (float64, float32, bfloat16 storage)
+# on training time per batch and accuracy, using a synthetic feature dataset
+# Run from the root folder: python -W ignore benchmarks/precision.py
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = ['resnet152_default', 'vgg16']
+PRECISIONS = ['float64', 'float32', 'bfloat16']
+TRAIN_BATCH_SIZE = 32
+INFERENCE_STEPS = 40
+TRAIN_SAMPLES = 1024
+VALID_SAMPLES = 256
+EPOCHS = 2
+
+for architecture in ARCHITECTURES:
+    neurons = BenchUtils.getArchitecture(architecture)
+    num_classes = neurons[-1]
+
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_SAMPLES + VALID_SAMPLES, neurons[0], num_classes)
+    train_batches = BenchUtils.getBatches(features[:TRAIN_SAMPLES], labels[:TRAIN_SAMPLES], TRAIN_BATCH_SIZE)
+    valid_batches = BenchUtils.getBatches(features[TRAIN_SAMPLES:], labels[TRAIN_SAMPLES:], TRAIN_BATCH_SIZE)
+
+    print(f"Architecture: {architecture} {neurons}")
+    baseline_time = None
+    for precision in PRECISIONS:
+        pc_model = PcTorch(neurons, precision=precision)
+        pc_model.set_training_parameters(
+            TRAIN_BATCH_SIZE,
+            INFERENCE_STEPS, 
+            'sigmoid', 
+            'adam', 
+            0.001,
+            0.9)
+
+        time_per_batch = BenchUtils.trainPcModel(pc_model, train_batches, num_classes, EPOCHS)
+        valid_accuracy = BenchUtils.evaluatePcModel(pc_model, valid_batches)
+
+        if baseline_time is None:
+            baseline_time = time_per_batch
+
+        print('precision: %8s | time/batch: %.4fs | speedup: %.2fx | val acc: %.3f' % 
+            (precision, time_per_batch, baseline_time/time_per_batch, valid_accuracy))
+
+    print("------------------------------------------------\n")
@@ -0,0 +1,62 @@
+# Single-sample prediction latency: `PcTorch.test_sample()` against the preallocated `Predictor` (`PcTorch.predictor()`),
+# reporting p50/p99 over many requests and checking the predictor against the latency targets below (CPU, float32)
+# Run from the root folder: python -W ignore benchmarks/predictor_latency.py
+
+import time
+import numpy as np
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = ['resnet152_default', 'resnet152_vary_fc_neurons']
+TRAIN_BATCH_SIZE = 32
+TRAIN_BATCHES = 20
+REQUESTS = 2000
+WARMUP_REQUESTS = 100
+PRECISION = 'float32'
+
+# Latency targets of the predictor (milliseconds)
+TARGET_P50_MS = 0.5
+TARGET_P99_MS = 1.0
+
+def latencies(function, samples):
+    for sample in samples[:WARMUP_REQUESTS]:
+        function(sample)
+
+    times = []
+    for sample in samples:
+        start = time.perf_counter()
+        function(sample)
+        times.append(time.perf_counter() - start)
+
+    return np.percentile(times, 50)*1000, np.percentile(times, 99)*1000
+
+for architecture in ARCHITECTURES:
+    neurons = BenchUtils.getArchitecture(architecture)
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*TRAIN_BATCHES + REQUESTS, neurons[0], num_classes)
+    batches = BenchUtils.getBatches(features[:TRAIN_BATCH_SIZE*TRAIN_BATCHES], labels[:TRAIN_BATCH_SIZE*TRAIN_BATCHES], TRAIN_BATCH_SIZE)
+
+    pc_model = PcTorch(neurons, precision=PRECISION)
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+    BenchUtils.trainPcModel(pc_model, batches, num_classes)
+
+    # test_sample() expects preprocessed samples
+    samples = pc_model.preprocessing(features[-REQUESTS:].to(pc_model.compute_dtype)).numpy()
+    predictor = pc_model.predictor(preprocess=False)
+    assert np.allclose(predictor.predict_numpy(samples[0]).reshape(-1), pc_model.test_sample(samples[0]).reshape(-1), atol=1e-5)
+
+    print(f"Architecture: {architecture} {neurons}")
+    with torch.no_grad():
+        p50, p99 = latencies(pc_model.test_sample, samples)
+    print('    test_sample | p50: %.3fms | p99: %.3fms' % (p50, p99))
+
+    p50, p99 = latencies(predictor.predict_numpy, samples)
+    status = 'PASS' if p50 <= TARGET_P50_MS and p99 <= TARGET_P99_MS else 'FAIL'
+    print('      Predictor | p50: %.3fms | p99: %.3fms | target p50 <= %.1fms, p99 <= %.1fms: %s' % (p50, p99, TARGET_P50_MS, TARGET_P99_MS, status))
+
+    print("------------------------------------------------\n")
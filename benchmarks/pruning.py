@@ -0,0 +1,55 @@
+# Structured pruning of a trained PcTorch model (`PcTorch.prune()`): number of parameters, feedforward
+# latency, training time per batch and accuracy before and after pruning, with and without fine-tuning,
+# for the `vary_fc_neurons` architecture
+# Run from the root folder: python -W ignore benchmarks/pruning.py
+
+import copy
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURE = 'resnet152_vary_fc_neurons'
+TRAIN_BATCH_SIZE = 32
+TRAIN_BATCHES = 100
+TEST_BATCHES = 20
+EPOCHS = 3
+FINE_TUNE_EPOCHS = 1
+KEEP_RATIOS = [0.5, 0.25, 0.1]
+PRECISION = 'float32'
+
+def countParameters(pc_model):
+    return sum(pc_model.w[l].numel() + pc_model.b[l].numel() for l in range(pc_model.n_layers-1))
+
+def report(name, pc_model, train_batches, test_batches, train_time):
+    features, _ = test_batches[0]
+    latency = BenchUtils.timeFunction(lambda: pc_model.batch_inference(features))
+    accuracy = BenchUtils.evaluatePcModel(pc_model, test_batches)
+    print('%22s | neurons: %22s | parameters: %8d | feedforward: %7.3fms | train batch: %7.2fms | accuracy: %.3f' % (name,
+        pc_model.neurons, countParameters(pc_model), latency*1000, train_time*1000, accuracy))
+
+neurons = BenchUtils.getArchitecture(ARCHITECTURE)
+num_classes = neurons[-1]
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*(TRAIN_BATCHES+TEST_BATCHES), neurons[0], num_classes)
+batches = BenchUtils.getBatches(features, labels, TRAIN_BATCH_SIZE)
+train_batches, test_batches = batches[:TRAIN_BATCHES], batches[TRAIN_BATCHES:]
+calibration = torch.cat([batch[0] for batch in train_batches[:10]])
+
+pc_model = PcTorch(neurons, precision=PRECISION)
+pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'relu', 'adam', 0.001, 0.9)
+BenchUtils.trainPcModel(pc_model, train_batches, num_classes, epochs=EPOCHS)
+train_time = BenchUtils.trainPcModel(copy.deepcopy(pc_model), train_batches[:10], num_classes)
+
+print(f"Architecture: {ARCHITECTURE} {neurons}")
+report('original', pc_model, train_batches, test_batches, train_time)
+
+for keep_ratio in KEEP_RATIOS:
+    pruned = pc_model.prune(keep_ratio, data=calibration)
+    train_time = BenchUtils.trainPcModel(copy.deepcopy(pruned), train_batches[:10], num_classes) # a copy, so the weights are not changed
+    report(f'keep {keep_ratio}', pruned, train_batches, test_batches, train_time)
+
+    train_time = BenchUtils.trainPcModel(pruned, train_batches, num_classes, epochs=FINE_TUNE_EPOCHS)
+    report(f'keep {keep_ratio} + fine-tune', pruned, train_batches, test_batches, train_time)
@@ -0,0 +1,61 @@
+# Int8 post-training quantisation (`PcTorch.quantize()`): weight size, latency (single sample and batch),
+# throughput and accuracy of the static (calibrated) and dynamic int8 models against the float model, on CPU
+# Run from the root folder: python -W ignore benchmarks/quantization.py
+
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = ['resnet152_default', 'resnet152_vary_fc_neurons']
+TRAIN_BATCH_SIZE = 32
+TRAIN_BATCHES = 100
+TEST_BATCHES = 20
+CALIBRATION_BATCHES = 8
+THROUGHPUT_BATCH_SIZE = 256
+PRECISION = 'float32'
+
+for architecture in ARCHITECTURES:
+    neurons = BenchUtils.getArchitecture(architecture)
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*(TRAIN_BATCHES+TEST_BATCHES), neurons[0], num_classes)
+    batches = BenchUtils.getBatches(features, labels, TRAIN_BATCH_SIZE)
+    train_batches, test_batches = batches[:TRAIN_BATCHES], batches[TRAIN_BATCHES:]
+    calibration = torch.cat([batch[0] for batch in train_batches[:CALIBRATION_BATCHES]])
+
+    pc_model = PcTorch(neurons, precision=PRECISION)
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+    BenchUtils.trainPcModel(pc_model, train_batches, num_classes)
+    float_predictions = [torch.argmax(pc_model.batch_inference(f), dim=0).cpu() for f, _ in test_batches]
+
+    models = {
+        'float32': pc_model,
+        'int8 static': pc_model.quantize(calibration),
+        'int8 dynamic': pc_model.quantize()
+    }
+
+    print(f"Architecture: {architecture} {neurons}")
+    for name, model in models.items():
+        if name == 'float32':
+            size = sum(4*(pc_model.w[l].numel() + pc_model.b[l].numel()) for l in range(pc_model.n_layers-1))
+        else:
+            size = model.size()
+
+        sample = test_batches[0][0][:1]
+        batch = test_batches[0][0]
+        large_batch = features[:THROUGHPUT_BATCH_SIZE]
+        latency_sample = BenchUtils.timeFunction(lambda: model.batch_inference(sample), repeat=50)
+        latency_batch = BenchUtils.timeFunction(lambda: model.batch_inference(batch), repeat=20)
+        throughput = THROUGHPUT_BATCH_SIZE/BenchUtils.timeFunction(lambda: model.batch_inference(large_batch))
+
+        accuracy = BenchUtils.evaluatePcModel(model, test_batches)
+        agreement = sum((torch.argmax(model.batch_inference(f), dim=0).cpu() == p).sum().item() for (f, _), p in zip(test_batches, float_predictions))
+        agreement = agreement/(len(test_batches)*TRAIN_BATCH_SIZE)
+
+        print('%12s | weights: %6.2f MB | latency (1 sample): %7.3fms | latency (%d samples): %7.3fms | throughput: %8.0f samples/s | accuracy: %.3f | agreement with float: %.3f' % (
+            name, size/2**20, latency_sample*1000, TRAIN_BATCH_SIZE, latency_batch*1000, throughput, accuracy, agreement))
+
+    print("------------------------------------------------\n")
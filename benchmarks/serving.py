@@ -0,0 +1,74 @@
+# Micro-batching inference server (`snn/InferenceServer.py`): a local open-loop load generator sends single-sample
+# requests with Poisson arrivals at increasing rates, and reports achieved throughput and request latency (p50/p99)
+# against serving each request with its own batch_inference() call (max_batch_size=1)
+# Run from the root folder: python -W ignore benchmarks/serving.py
+
+import asyncio
+import time
+import numpy as np
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+from snn.InferenceServer import InferenceServer
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURE = 'resnet152_default'
+TRAIN_BATCH_SIZE = 32
+TRAIN_BATCHES = 20
+REQUESTS = 2000
+RATES = [250, 500, 1000, 2000, 4000, 8000] # requests per second
+SERVERS = {'per request': (1, 0.0), 'micro-batching': (64, 0.002)} # (max_batch_size, max_latency)
+PRECISION = 'float32'
+
+async def request(server, features, latencies):
+    start = time.perf_counter()
+    await server.predict(features)
+    latencies.append(time.perf_counter() - start)
+
+async def generateLoad(pc_model, samples, rate, max_batch_size, max_latency, seed=0):
+    server = InferenceServer(pc_model, max_batch_size, max_latency)
+    await server.start()
+
+    # Warm up (workspace and kernels)
+    await asyncio.gather(*[server.predict(samples[i]) for i in range(max_batch_size)])
+    server.batches = server.requests = 0
+
+    generator = np.random.default_rng(seed)
+    intervals = generator.exponential(1.0/rate, len(samples))
+    latencies = []
+    tasks = []
+
+    start = time.perf_counter()
+    next_arrival = start
+    for i in range(len(samples)):
+        next_arrival += intervals[i]
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(request(server, samples[i], latencies)))
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await server.stop()
+
+    return len(samples)/elapsed, np.percentile(latencies, 50)*1000, np.percentile(latencies, 99)*1000, server.average_batch_size()
+
+neurons = BenchUtils.getArchitecture(ARCHITECTURE)
+num_classes = neurons[-1]
+features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*TRAIN_BATCHES + REQUESTS, neurons[0], num_classes)
+batches = BenchUtils.getBatches(features[:TRAIN_BATCH_SIZE*TRAIN_BATCHES], labels[:TRAIN_BATCH_SIZE*TRAIN_BATCHES], TRAIN_BATCH_SIZE)
+
+pc_model = PcTorch(neurons, precision=PRECISION)
+pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+BenchUtils.trainPcModel(pc_model, batches, num_classes)
+samples = features[-REQUESTS:]
+
+print(f"Architecture: {ARCHITECTURE} {neurons}, requests: {REQUESTS}")
+for name, (max_batch_size, max_latency) in SERVERS.items():
+    for rate in RATES:
+        throughput, p50, p99, batch_size = asyncio.run(generateLoad(pc_model, samples, rate, max_batch_size, max_latency))
+        print('%14s | offered: %5d req/s | throughput: %7.0f req/s | latency p50: %8.3fms | p99: %8.3fms | avg batch: %5.1f' % (
+            name, rate, throughput, p50, p99, batch_size))
+    print("------------------------------------------------\n")
@@ -0,0 +1,59 @@
+# Compares the PcTorch inference relaxation solvers on the iterations and wall time
+# needed to reach the same residual, on synthetic ImageNet-like feature batches
+# Run from the root folder: python -W ignore benchmarks/solvers.py
+
+import time
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+from snn import solvers
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+ARCHITECTURES = ['resnet152_default', 'resnet152_vary_depth', 'vgg16']
+TRAIN_BATCH_SIZE = 32
+WARMUP_BATCHES = 20 # training batches before the measurement, so weights are not random
+MAX_ITERATIONS = 500
+RESIDUAL_TOLERANCE = 0.001
+PRECISION = 'float32'
+
+for architecture in ARCHITECTURES:
+    neurons = BenchUtils.getArchitecture(architecture)
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*(WARMUP_BATCHES+1), neurons[0], num_classes)
+    batches = BenchUtils.getBatches(features, labels, TRAIN_BATCH_SIZE)
+
+    # Train a model with the default inference, then copy its weights to every solver
+    pc_model = PcTorch(neurons, precision=PRECISION)
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+    BenchUtils.trainPcModel(pc_model, batches[:-1], num_classes)
+
+    test_features, test_labels = batches[-1]
+    data = pc_model.preprocessing(test_features.to(pc_model.compute_dtype).t()).to(PcTorch.device)
+    targets = F.one_hot(test_labels, num_classes=num_classes).t().to(PcTorch.device, dtype=pc_model.compute_dtype)
+
+    print(f"Architecture: {architecture} {neurons}, target residual: {RESIDUAL_TOLERANCE}")
+    for solver in solvers.SOLVERS:
+        pc_model.set_training_parameters(
+            TRAIN_BATCH_SIZE, 
+            MAX_ITERATIONS, 
+            'sigmoid', 
+            'adam', 
+            0.001, 
+            0.9, 
+            solver=solver, 
+            residual_tolerance=RESIDUAL_TOLERANCE)
+        pc_model.min_inference_error = 0 # stop only on the residual
+
+        x = pc_model.feedforward(data)
+        x[len(neurons)-1] = targets
+        start = time.perf_counter()
+        pc_model.inference(x, copy=False)
+        seconds = time.perf_counter() - start
+
+        print('solver: %9s | iterations: %4d | residual: %.5f | time: %.3fs' % 
+            (solver, pc_model.inference_steps, pc_model.inference_residual, seconds))
+
+    print("------------------------------------------------\n")
@@ -0,0 +1,51 @@
+# Compares dense and sparse (gather of active neurons, CSR) products w @ F(x) of ReLU activations,
+# over sparsity levels, to find the crossover where skipping the zeros pays off
+#   - 'random': zeros spread over all neurons and samples
+#   - 'neurons': whole neurons inactive for the batch (dead ReLUs), the best case for the gather method
+# Run from the root folder: python -W ignore benchmarks/sparse_matmul.py
+
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+SIZES = [(256, 2048), (2048, 2048), (256, 25088)] # (output neurons, input neurons)
+BATCH_SIZE = 32
+SPARSITY = [0.0, 0.5, 0.7, 0.8, 0.9, 0.95, 0.99]
+PATTERNS = ['random', 'neurons']
+PRECISION = 'float32'
+
+def sparseActivations(neurons, sparsity, pattern, dtype):
+    fx = torch.relu(torch.randn(neurons, BATCH_SIZE, dtype=dtype, device=PcTorch.device)) + 0.01
+    if pattern == 'neurons':
+        mask = torch.rand(neurons, 1, device=PcTorch.device) >= sparsity
+    else:
+        mask = torch.rand(neurons, BATCH_SIZE, device=PcTorch.device) >= sparsity
+    return fx * mask
+
+for out_neurons, in_neurons in SIZES:
+    pc_model = PcTorch([in_neurons, out_neurons, out_neurons], precision=PRECISION) # PcTorch requires 3 layers, the first one is benchmarked
+    w, _ = pc_model.weights(0)
+    pc_model.activation = 'relu'
+
+    print(f"Weights: {out_neurons}x{in_neurons}, batch size: {BATCH_SIZE}")
+    for pattern in PATTERNS:
+        for sparsity in SPARSITY:
+            fx = sparseActivations(in_neurons, sparsity, pattern, pc_model.compute_dtype)
+            expected = torch.matmul(w, fx)
+
+            times = {}
+            for method in [None] + PcTorch.SparseMethods:
+                pc_model.sparse_threshold = None if method is None else 0.0
+                pc_model.sparse_method = method or 'gather'
+                assert torch.allclose(pc_model.activation_product(w, fx, 0), expected, atol=1e-4)
+                times[method or 'dense'] = BenchUtils.timeFunction(lambda: pc_model.activation_product(w, fx, 0))
+
+            best = min(times, key=times.get)
+            print('pattern: %7s | sparsity: %.2f | dense: %.3fms | gather: %.3fms | csr: %.3fms | best: %s' % (pattern, sparsity,
+                times['dense']*1000, times['gather']*1000, times['csr']*1000, best))
+
+    print("------------------------------------------------\n")
@@ -0,0 +1,44 @@
+# Compares the per-layer PcTorch inference with the stacked (batched bmm) inference
+# on deep networks with hidden layers of equal size (`vary_depth` experiments)
+# Run from the root folder: python -W ignore benchmarks/stacked_inference.py
+
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters
+HIDDEN_LAYERS = [3, 4, 5, 6]
+FC_NEURONS = 256
+TRAIN_BATCH_SIZE = 32
+INFERENCE_STEPS = 40
+PRECISION = 'float32'
+
+for hidden_layers in HIDDEN_LAYERS:
+    neurons = [2048] + [FC_NEURONS]*(hidden_layers-1) + [50]
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE, neurons[0], num_classes)
+
+    print(f"Architecture: {neurons}")
+    for stacked_inference in [False, True]:
+        pc_model = PcTorch(neurons, precision=PRECISION)
+        pc_model.set_training_parameters(
+            TRAIN_BATCH_SIZE,
+            INFERENCE_STEPS, 
+            'sigmoid', 
+            'adam', 
+            0.001,
+            0.9,
+            stacked_inference=stacked_inference)
+        pc_model.min_inference_error = 0 # always run INFERENCE_STEPS iterations
+
+        x0 = pc_model.feedforward(pc_model.preprocessing(features.to(pc_model.compute_dtype).t()).to(PcTorch.device))
+        x0[len(neurons)-1] = F.one_hot(labels, num_classes=num_classes).t().to(PcTorch.device, dtype=pc_model.compute_dtype)
+
+        seconds = BenchUtils.timeFunction(lambda: pc_model.inference(dict(x0), copy=False), repeat=10, warmup=2)
+        mode = 'stacked' if stacked_inference else 'per-layer'
+        print('inference: %9s | time: %.4fs | iterations/s: %8.1f' % (mode, seconds, INFERENCE_STEPS/seconds))
+
+    print("------------------------------------------------\n")
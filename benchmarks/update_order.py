@@ -0,0 +1,49 @@
+# Compares the inference update orderings (Jacobi, Gauss-Seidel bottom-up / top-down, red-black)
+# on iterations and wall time to reach the inference tolerance, for the `vary_depth` architectures
+# Run from the root folder: python -W ignore benchmarks/update_order.py
+
+import time
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+import benchmarks.BenchUtils as BenchUtils
+
+# Benchmark parameters (experiments/ImageNet_50_classes_224x224/vary_depth)
+HIDDEN_LAYERS = [2, 3, 4, 5, 6]
+FC_NEURONS = 256
+TRAIN_BATCH_SIZE = 32
+WARMUP_BATCHES = 20 # training batches before the measurement, so weights are not random
+MAX_ITERATIONS = 1000
+TOLERANCE = 0.000001
+PRECISION = 'float32'
+
+for hidden_layers in HIDDEN_LAYERS:
+    neurons = [2048] + [FC_NEURONS]*(hidden_layers-1) + [50]
+    num_classes = neurons[-1]
+    features, labels = BenchUtils.getSyntheticDataset(TRAIN_BATCH_SIZE*(WARMUP_BATCHES+1), neurons[0], num_classes)
+    batches = BenchUtils.getBatches(features, labels, TRAIN_BATCH_SIZE)
+
+    pc_model = PcTorch(neurons, precision=PRECISION)
+    pc_model.set_training_parameters(TRAIN_BATCH_SIZE, 40, 'sigmoid', 'adam', 0.001, 0.9)
+    BenchUtils.trainPcModel(pc_model, batches[:-1], num_classes)
+
+    test_features, test_labels = batches[-1]
+    data = pc_model.preprocessing(test_features.to(pc_model.compute_dtype).t()).to(PcTorch.device)
+    targets = F.one_hot(test_labels, num_classes=num_classes).t().to(PcTorch.device, dtype=pc_model.compute_dtype)
+
+    print(f"Architecture: {neurons}, tolerance: {TOLERANCE}")
+    for update_order in PcTorch.UpdateOrders:
+        pc_model.set_training_parameters(TRAIN_BATCH_SIZE, MAX_ITERATIONS, 'sigmoid', 'adam', 0.001, 0.9, update_order=update_order)
+        pc_model.min_inference_error = TOLERANCE
+
+        x = pc_model.feedforward(data)
+        x[len(neurons)-1] = targets
+        start = time.perf_counter()
+        pc_model.inference(x, copy=False)
+        seconds = time.perf_counter() - start
+
+        print('order: %17s | iterations: %4d | time: %.3fs' % (update_order, pc_model.inference_steps, seconds))
+
+    print("------------------------------------------------\n")
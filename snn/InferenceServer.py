@@ -0,0 +1,135 @@
+import asyncio
+import torch
+from concurrent.futures import ThreadPoolExecutor
+
+class InferenceServer:
+    """Asyncio micro-batching around `batch_inference()`: incoming feature vectors are queued, grouped in batches of up to `max_batch_size` samples (waiting at most `max_latency` seconds after the first request of the batch), and each batch is processed by a single `batch_inference()` call in a worker thread
+
+    Usage (inside a running event loop):
+        server = InferenceServer(pc_model)
+        await server.start()
+        output = await server.predict(features)
+        await server.stop()
+
+    Remarks:
+        - `model` can be any object with a `batch_inference(data)` method returning [num_classes, batch_size] (PcTorch, QuantizedPcTorch)
+        - Batches run one at a time in a single worker thread, since the models reuse internal buffers. Requests arriving meanwhile form the next batch
+    """
+
+    def __init__(self, model, max_batch_size=64, max_latency=0.002):
+        """
+        Args:
+            model: trained model with a `batch_inference()` method
+            max_batch_size: maximum number of samples of a batch
+            max_latency: maximum time (seconds) a request waits for the batch to fill
+        """
+        assert max_batch_size >= 1
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.queue = None
+        self.worker = None
+        self.executor = None
+
+        # Statistics
+        self.batches = 0
+        self.requests = 0
+
+    async def start(self):
+        """Starts the batching worker in the current event loop
+        """
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.worker = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Stops the batching worker. Requests still queued are cancelled. Does nothing if the worker is not running (not started, or already stopped), and the server can be started again
+        """
+        if self.worker is None:
+            return
+
+        # Cleared first, so concurrent or repeated calls return immediately
+        worker, self.worker = self.worker, None
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            future.cancel()
+
+        self.executor.shutdown(wait=True)
+        self.queue = None
+        self.executor = None
+
+    async def predict(self, features):
+        """Queues a single sample and waits for its prediction
+
+        Args:
+            features: torch array with shape [input_size]
+
+        Returns:
+            A torch array with the output layer, shape [num_classes]
+        """
+        assert self.queue is not None, "The server is not running, see start()"
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((features, future))
+        return await future
+
+    async def next_batch(self, batch):
+        """Waits for the first request, then collects requests into `batch` (a list, filled in place so the requests already collected are known if the worker is cancelled) until the batch is full or `max_latency` has passed
+        """
+        loop = asyncio.get_running_loop()
+        batch.append(await self.queue.get())
+        deadline = loop.time() + self.max_latency
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self.next_batch(batch)
+
+                try:
+                    data = torch.stack([features for features, _ in batch])
+                    output = await loop.run_in_executor(self.executor, self.model.batch_inference, data)
+                except Exception as error:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+                    continue
+
+                self.batches += 1
+                self.requests += len(batch)
+                for i, (_, future) in enumerate(batch):
+                    if not future.done(): # the request may have been cancelled
+                        future.set_result(output[:, i].clone())
+
+        except asyncio.CancelledError:
+            # Requests taken from the queue but not answered would wait forever
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            raise
+
+    def average_batch_size(self):
+        return self.requests/max(self.batches, 1)
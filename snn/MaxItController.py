@@ -0,0 +1,78 @@
+import math
+import numpy as np
+
+class MaxItController:
+    """Adjusts the inference iteration budget (`max_it`) from the convergence of the recent training batches. Every `interval` batches:
+        - if more than `max_unconverged` of the batches used the whole budget without reaching the target error change, the budget grows by `grow`
+        - otherwise, the budget is set to the `quantile` of the iterations used, times `margin`
+    The budget is kept within [min_it, max_it]
+    """
+
+    def __init__(self, initial_max_it, min_it=5, max_it=200, target_error_change=0.00000001, interval=100, quantile=0.9, margin=1.25, grow=1.5, max_unconverged=0.1):
+        """
+        Args:
+            initial_max_it: initial budget
+            min_it: minimum budget
+            max_it: maximum budget
+            target_error_change: inference is considered converged when the mean error change of the last iteration is below this value
+            interval: number of batches between budget updates
+            quantile: quantile of the iterations used, for the new budget
+            margin: factor applied to the quantile
+            grow: factor applied to the budget when too many batches do not converge
+            max_unconverged: fraction of batches allowed not to converge
+        """
+        assert 1 <= min_it <= max_it
+        self.min_it = min_it
+        self.max_it = max_it
+        self.target_error_change = target_error_change
+        self.interval = interval
+        self.quantile = quantile
+        self.margin = margin
+        self.grow = grow
+        self.max_unconverged = max_unconverged
+
+        self.history = [] # budgets chosen
+        self.restart(initial_max_it)
+
+    def clamp(self, budget):
+        return int(min(max(budget, self.min_it), self.max_it))
+
+    def restart(self, budget):
+        """Sets the budget (clamped to [min_it, max_it]) and discards the batches observed since the last update, e.g. when training restarts with a new `max_it`
+
+        Returns:
+            The budget for the next batch
+        """
+        self.budget = self.clamp(budget)
+        self.steps = []
+        self.unconverged = 0
+        return self.budget
+
+    def observe(self, steps, error_change=None):
+        """Records the convergence of a batch, and updates the budget every `interval` batches
+
+        Args:
+            steps: iterations used by the inference of the batch
+            error_change: mean error change of the last iteration (None if unknown: the batch is not counted as unconverged)
+
+        Returns:
+            The budget for the next batch
+        """
+        self.steps.append(steps)
+        if steps >= self.budget and error_change is not None and error_change >= self.target_error_change:
+            self.unconverged += 1
+
+        if len(self.steps) >= self.interval:
+            previous = self.budget
+            if self.unconverged > self.max_unconverged*len(self.steps):
+                self.budget = self.clamp(math.ceil(self.budget*self.grow))
+            else:
+                self.budget = self.clamp(math.ceil(np.quantile(self.steps, self.quantile)*self.margin))
+
+            self.history.append(self.budget)
+            print(f"Inference budget: max_it {previous} -> {self.budget} (unconverged batches: {self.unconverged}/{len(self.steps)}, median iterations: {np.median(self.steps):.0f})")
+
+            self.steps = []
+            self.unconverged = 0
+
+        return self.budget
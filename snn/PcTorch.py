@@ -4,27 +4,47 @@ import torch.nn
 import numpy as np
 import math
 import copy
+import collections
 import sys
 from sklearn import metrics
 from torchvision import transforms
 # from util.util import dRelu, dSigmoid
 from snn import util
+from snn import kernels
+from snn import optimizers
+from snn import solvers
+from snn.StateCache import StateCache
+from snn.MaxItController import MaxItController
+from snn.QuantizedPcTorch import QuantizedPcTorch
+from snn.Predictor import Predictor
 
 class PcTorch:
-    dtype = np.float
     device = None
 
-    ActivationFunctions = {'relu': torch.nn.ReLU(), 'sigmoid': torch.nn.Sigmoid() , 'linear': util.Linear}
+    ActivationFunctions = {'relu': util.Relu, 'sigmoid': util.Sigmoid, 'linear': util.Linear}
     ActivationDerivatives = {'relu': util.dRelu, 'sigmoid': util.dSigmoid, 'linear': util.dLinear}
+    ActivationPairs = {'relu': util.ReluAndDerivative, 'sigmoid': util.SigmoidAndDerivative, 'linear': util.LinearAndDerivative}
     PreprocessingFunctions = {'relu': util.preRelu, 'sigmoid': util.preSigmoid, 'linear': util.preLinear}
-    Optimizers = ['none', 'adam', 'sgd']
-
-    def __init__(self, neurons):
+    Optimizers = list(optimizers.OPTIMIZERS)
+    UpdateOrders = ['jacobi', 'gauss_seidel_up', 'gauss_seidel_down', 'red_black']
+    SparseMethods = ['gather', 'csr']
+
+    # Numeric precision modes: (storage dtype, compute dtype)
+    Precisions = {
+        'float64': (torch.float64, torch.float64),
+        'float32': (torch.float32, torch.float32),
+        'bfloat16': (torch.bfloat16, torch.float32)
+    }
+
+    def __init__(self, neurons, precision='float64', input_rank=None, layers=None):
         """
         Intializes the network weight matrices
         
         Args:
             neurons: list of integers, representing the size of each layer
+            precision: numeric precision of the network. One of 'float64' (default), 'float32' or 'bfloat16'. With 'bfloat16', weights and data batches are stored in bfloat16, while the computations are carried out in float32 (the optimizer updates float32 master weights, see `update_weights()`)
+            input_rank: (optional) rank r of a factorised input layer, w[0] = U·V with U [neurons[1], r] and V [r, neurons[0]], see `input_product()`. The input projection then costs O(r·(neurons[0]+neurons[1])) instead of O(neurons[0]·neurons[1]) per sample
+            layers: (optional) dictionary of spatial connections (`snn/layers.py`: Conv2d, AvgPool2d), indexed by layer l (connection from layer l to layer l+1). Other connections are dense. The neurons of spatial layers are their flattened feature maps, see `layers.neurons()`
 
         Remarks: 
             - neurons[0]  : input shape
@@ -40,44 +60,119 @@ class PcTorch:
         self.n_layers = len(self.neurons)
         assert self.n_layers > 2 
 
+        # Set precision
+        if precision not in PcTorch.Precisions:
+            print(f"Warning: Precision '{precision}' not found, using default.")
+            precision = 'float64'
+
+        self.precision = precision
+        self.dtype, self.compute_dtype = PcTorch.Precisions[precision]
+
+        # Spatial connections
+        self.layer_ops = {} if layers is None else dict(layers)
+        for l, op in self.layer_ops.items():
+            assert op.in_neurons == self.neurons[l] and op.out_neurons == self.neurons[l+1]
+        assert input_rank is None or 0 not in self.layer_ops
+
         # Initialize weights
         self.w = {}
         self.b = {}
 
         for l in range(self.n_layers-1):
             next_layer_neurons = self.neurons[l+1]
-            this_layer_neurons = self.neurons[l]
-            self.w[l] = (torch.rand(
-                next_layer_neurons,
-                this_layer_neurons,
-                dtype=PcTorch.dtype).to(PcTorch.device) -0.5)/11
+            self.w[l] = ((torch.rand(
+                *self.weight_shape(l),
+                dtype=self.compute_dtype) -0.5)/11).to(PcTorch.device, dtype=self.dtype)
 
             self.b[l] = torch.zeros(
                 next_layer_neurons,
                 1,
-                dtype=PcTorch.dtype).to(PcTorch.device)
-
-        # Optimizer variables (adam)
-        self.vdw = {}
-        self.vdb = {}
-        self.sdw = {}
-        self.sdb = {}
-
-        for l in range(self.n_layers-1):
-            self.vdw[l] = torch.zeros(self.w[l].shape, dtype=PcTorch.dtype, device=PcTorch.device)
-            self.vdb[l] = torch.zeros(self.b[l].shape, dtype=PcTorch.dtype, device=PcTorch.device)
-            self.sdw[l] = torch.zeros(self.w[l].shape, dtype=PcTorch.dtype, device=PcTorch.device)
-            self.sdb[l] = torch.zeros(self.b[l].shape, dtype=PcTorch.dtype, device=PcTorch.device)
+                dtype=self.dtype).to(PcTorch.device)
+
+        # Factorised input layer: w[0] is replaced by the factors U (w_u) and V (w_v), initialized so that
+        # U·V has the same variance as the dense initialization
+        self.input_rank = input_rank
+        self.w_u = None
+        self.w_v = None
+        if self.input_rank is not None:
+            assert 0 < self.input_rank <= min(self.neurons[0], self.neurons[1])
+            del self.w[0]
+            scale = 2*math.sqrt(3/(11*math.sqrt(12*self.input_rank)))
+            self.w_u = ((torch.rand(self.neurons[1], self.input_rank, dtype=self.compute_dtype) - 0.5)*scale).to(PcTorch.device, dtype=self.dtype)
+            self.w_v = ((torch.rand(self.input_rank, self.neurons[0], dtype=self.compute_dtype) - 0.5)*scale).to(PcTorch.device, dtype=self.dtype)
+
+        # When all hidden layers have the same size, the hidden-to-hidden weights are stored in a single 3-D tensor,
+        # and w[l], b[l] are views of it (see `descent_directions()`)
+        self.w_stack = None
+        self.b_stack = None
+        if self.n_layers > 3 and len(set(self.neurons[1:-1])) == 1 and not self.layer_ops:
+            stacked = range(1,self.n_layers-2)
+            self.w_stack = torch.stack([self.w[l] for l in stacked])
+            self.b_stack = torch.stack([self.b[l] for l in stacked])
+            for l in stacked:
+                self.w[l] = self.w_stack[l-1]
+                self.b[l] = self.b_stack[l-1]
 
         self.alpha = 0.01
         self.b1 = 0.9
         self.b2 = 0.999
         self.epslon = 0.00000001
-        self.t = 1
+        self.weight_decay = 0.01 # adamw
+        self.pc_optimizer = None # see `set_optimizer()`
+        self.master_weights = None # float32 copies of the weights and biases updated by the optimizer with bfloat16 storage, see `update_weights()`
 
         # Predictive Coding parameters 
         self.beta = 0.1 # Inference rate
         self.min_inference_error = 0.00000001
+        self.max_it = 10 # inference iterations, see `set_training_parameters()`
+        self.fixed_prediction = False # see `inference_fixed_prediction()`
+        self.incremental_update_interval = 0 # see `relax()`
+        self.closed_form_linear = True # see `inference_linear_equilibrium()`
+        self.stacked_inference = False # see `descent_directions()` and `refresh_errors()`
+        self.update_order = 'jacobi' # see `relaxation_phases()`
+        self.direct_solver_max_neurons = 4096 # larger systems use conjugate gradient
+        self.cg_tolerance = 0.000001 # relative residual of conjugate gradient
+        self.solver = 'gd' # see `snn/solvers.py`
+        self.relaxation_solver = solvers.SOLVERS[self.solver](self.beta)
+        self.residual_tolerance = 0 # stop inference when the mean residual norm is smaller (0: disabled)
+        self.inference_residual = None # mean residual norm of the last `relax()` call (with `residual_tolerance`)
+        self.per_sample_convergence = False # see `compact_relaxation_state()`
+        self.sync_free_inference = False # see `relax()`
+        self.convergence_check_interval = 0 # iterations between host-side convergence checks of the sync-free inference (0: never)
+        self.inference_backend = 'eager'
+        self.relaxation_kernel = kernels.get_relaxation_kernel(self.inference_backend)
+
+        # Number of iterations of the last inference call, and total iterations of the training batches (see `warm_start_inference()`)
+        self.inference_steps = 0
+        self.total_inference_steps = 0
+        self.inference_error_change = None # mean error change of the last iteration of `inference()`
+
+        # Adaptive iteration budget, see `set_max_it_controller()`
+        self.max_it_controller = None
+
+        # Warm start of inference from the states of the previous epoch, see `set_state_cache()`
+        self.state_cache = None
+        self.reset_warm_start_stats()
+
+        # Number of inference iterations performed by each sample of the last batch, and its histogram (index: iterations)
+        self.inference_iterations = None
+        self.iterations_histogram = None
+
+        # Sparse products with ReLU activations, see `activation_product()`
+        self.sparse_threshold = None # minimum sparsity of F(x) to use sparse products (None: disabled)
+        self.sparse_method = 'gather'
+        self.activation_sparsity = {} # last measured sparsity of F(x[l]), indexed by layer
+
+        # Input layer activation and projection of the current batch, see `input_projection()`
+        self.input_cache = None
+
+        # F(x[l]) and dF(x[l]) of the hidden layers, shared by feedforward(), inference() and gradients(), see `cached_activation()`
+        self.activation_cache = {'x': {}, 'Fx': {}, 'dFx': {}}
+
+        # Preallocated buffers, see `get_workspace()`. Only the workspaces of the `max_workspaces` most recently used batch sizes are kept
+        self.workspaces = collections.OrderedDict()
+        self.max_workspaces = 2
+        self.workspace_allocations = 0
 
     def train(self, 
         train_data, 
@@ -117,7 +212,7 @@ class PcTorch:
 
         self.batch_size = batch_size
         self.epochs = epochs
-        self.max_it = max_it
+        self.set_max_it(max_it)
 
         assert self.batch_size <= self.train_samples_count
         assert self.epochs >= 1
@@ -140,14 +235,18 @@ class PcTorch:
         self.alpha = learning_rate
 
         # Define activation function
+        self.activation = activation
         self.F = PcTorch.ActivationFunctions[activation]
         self.dF = PcTorch.ActivationDerivatives[activation]
+        self.FdF = PcTorch.ActivationPairs[activation]
         self.preprocessing = PcTorch.PreprocessingFunctions[activation]
 
         self.optimizer = optimizer
         if self.optimizer  not in PcTorch.Optimizers:
             self.optimizer  = PcTorch.Optimizers[0]
 
+        self.set_optimizer()
+
         # Perform deep copy to avoid modifying original arrays?
         # train_data = copy.deepcopy(train_data)
         # train_labels = copy.deepcopy(train_labels)
@@ -188,24 +287,29 @@ class PcTorch:
         out_layer = self.n_layers-1
         n_batches = len(self.train_data)
         for epoch in range(self.epochs):
+            self.reset_warm_start_stats(keep_cold=True)
+            self.total_inference_steps = 0
         
             # Iterate over the training batches
             for batch_index in range(n_batches):
-                train_data = self.train_data[batch_index].to(PcTorch.device)
-                train_labels = self.train_labels[batch_index].to(PcTorch.device)
+                train_data = self.train_data[batch_index].to(PcTorch.device, dtype=self.compute_dtype)
+                train_labels = self.train_labels[batch_index].to(PcTorch.device, dtype=self.compute_dtype)
+                indices = range(batch_index*self.batch_size, (batch_index+1)*self.batch_size)
 
                 # Feedforward
                 x = self.feedforward(train_data)
 
                 # Perform inference
                 x[out_layer] = train_labels
-                x,e = self.inference(x)
+                x,e = self.warm_start_inference(x, indices)
 
                 # Update weightsx
                 self.update_weights(x,e)
 
                 if batch_index %50 == 0:
                     print(f"batch: {batch_index+1}/{PROCESS_BATCH_COUNT}")
+                    if self.per_sample_convergence and self.iterations_histogram is not None:
+                        print("inference iterations histogram:", self.iterations_histogram.tolist())
 
                 if batch_index> PROCESS_BATCH_COUNT:
                     break
@@ -215,8 +319,8 @@ class PcTorch:
             groundtruth = []
             loss = 0
             for batch_index in range(PROCESS_BATCH_COUNT):
-                train_data = self.train_data[batch_index].to(PcTorch.device)
-                train_labels = self.train_labels[batch_index].to(PcTorch.device)
+                train_data = self.train_data[batch_index].to(PcTorch.device, dtype=self.compute_dtype)
+                train_labels = self.train_labels[batch_index].to(PcTorch.device, dtype=self.compute_dtype)
 
                 # Show training loss for current batch
                 x = self.feedforward(train_data)
@@ -237,8 +341,8 @@ class PcTorch:
             groundtruth = []
 
             for i in range(len(self.valid_data)):
-                valid_data = self.valid_data[i].to(PcTorch.device)
-                valid_labels = self.valid_labels[i].to(PcTorch.device)
+                valid_data = self.valid_data[i].to(PcTorch.device, dtype=self.compute_dtype)
+                valid_labels = self.valid_labels[i].to(PcTorch.device, dtype=self.compute_dtype)
 
                 x = self.feedforward(valid_data)
                 valid_loss += self.mse(x[out_layer], valid_labels)/len(self.valid_data)
@@ -254,6 +358,9 @@ class PcTorch:
             print(f"Epoch: {epoch+1}/{self.epochs}")
             print("Loss: ", loss, "Valid Loss: ", valid_loss)
             print("Accuracy: ", train_accuracy, "Valid Accuracy: ", valid_accuracy)
+            print("Inference iterations: ", self.total_inference_steps)
+            if self.state_cache is not None:
+                self.print_warm_start_stats()
 
             self.train_loss_h.append(loss)
             self.train_acc_h.append(train_accuracy*100.0)
@@ -284,7 +391,7 @@ class PcTorch:
             batch_size: size of batch
 
         Returns: 
-            - A list of pytorch arrays, where each array has shape [data_size, batch_size]
+            - A list of pytorch arrays, where each array has shape [data_size, batch_size], stored with the network storage precision
             - A similar list for labels
         """
         samples_count = len(data)
@@ -307,11 +414,12 @@ class PcTorch:
             labels_array = np.hstack(labels_samples)
 
             # Convert to pytorch array and append to the return variables
+            # Preprocessing is applied with the compute precision, and the result is stored with the storage precision
             data_batches.append(
-                self.preprocessing(torch.from_numpy(data_array.astype(PcTorch.dtype)))
+                self.preprocessing(torch.from_numpy(data_array).to(self.compute_dtype)).to(self.dtype)
             )
             labels_batches.append(
-                torch.from_numpy(labels_array.astype(PcTorch.dtype))
+                torch.from_numpy(labels_array).to(self.dtype)
             )
 
         return data_batches, labels_batches
@@ -320,75 +428,967 @@ class PcTorch:
         """Makes a batch forward pass given the input data passed
 
         Args: 
-            data_batch: pytorch array with shape [data_size, batch_size], where 'data_size' must match self.w[0].shape[1
+            data_batch: pytorch array with shape [data_size, batch_size], where 'data_size' must match self.neurons[0]
             
         Returns:
             The neuron states of all layers 
         """
-        assert data_batch.shape[0] == self.w[0].shape[1]
-        x = {0:data_batch}
+        assert data_batch.shape[0] == self.neurons[0]
+        x = {0:data_batch.to(self.compute_dtype)}
+        self.clear_activation_cache()
         for l in range(1,self.n_layers):
-            #if l == 1:
-            if False:
-                x[l] = torch.matmul(self.w[l-1],x[l-1]) + self.b[l-1] 
-                # Not applying activation on first layer
-                # https://www.reddit.com/r/MachineLearning/comments/2c0yw1/do_inputoutput_neurons_of_neural_networks_have/
+            if l == 1:
+                Fx = self.F(x[0])
+                product, h = self.input_product(Fx)
+                x[1] = product + self.b[0].to(self.compute_dtype)
             else:
+                w, b = self.weights(l-1)
                 Fx = self.F(x[l-1])
-                x[l] = torch.matmul(self.w[l-1],Fx) + self.b[l-1]
+                x[l] = self.activation_product(w, Fx, l-1) + b
+
+            # The input layer is clamped, so its projection is reused by inference() and gradients()
+            if l == 1:
+                self.input_cache = {'x': x[0], 'Fx': Fx, 'mu': x[1], 'h': h}
+            else:
+                self.store_activation(x, l-1, Fx)
 
             # if np.isnan(torch.min(x[l])):
             #     print(f"Is nan:")
 
         return x
 
-    def inference(self, x):
-        """Performs (batch) inference in the network, according to the predictive coding equations
+    def inference(self, x, copy=True):
+        """Performs (batch) inference in the network, according to the predictive coding equations. The non-iterative methods (fixed prediction, closed-form linear equilibrium) are used when enabled, see `inference_method()`. Otherwise the states are relaxed iteratively by `relax()`
         
         Args: 
             x: neuron activations for each layer (batch form)
+            copy: return copies of the hidden activations and errors. With False, they may be workspace buffers (see `get_workspace()`), owned by the network and overwritten by the next inference with the same batch size. The training loop uses False, to avoid the copies
 
         Returns:
             The (relaxed) activations and layer-wise error neurons (batch form)
         """
-        update_rate = self.beta
-        # batch_size = x[0].shape[1]
+        method = self.inference_method()
+        if method == 'fixed_prediction':
+            x, e = self.inference_fixed_prediction(x)
+        elif method == 'linear_equilibrium':
+            x, e = self.inference_linear_equilibrium(x)
+        else:
+            x, e = self.relax(x)
+
+        if copy:
+            x = {l:(torch.clone(x[l]) if 0 < l < self.n_layers-1 else x[l]) for l in x}
+            e = {l:torch.clone(e[l]) for l in e}
+        return x, e
 
-        # Calculate initial error neuron values: 
-        # e[l] (x[l]-mu[l])/variance : assume variance is 1 
-        e = {}
-        previous_error = torch.zeros(self.batch_size, dtype=PcTorch.dtype, device=PcTorch.device) # square of the sum of the of error neurons 
+    def inference_method(self):
+        """Returns the inference method used by `inference()` with the current settings. When several settings are enabled, the first one in this order takes precedence:
+            - 'relaxation' for networks with spatial connections
+            - 'fixed_prediction', 'linear_equilibrium' (linear activation)
+            - 'relaxation' otherwise, with the hooks selected by the other settings (see `relaxation_settings()`)
+        """
+        if self.layer_ops:
+            return 'relaxation'
+        if self.fixed_prediction:
+            return 'fixed_prediction'
+        if self.activation == 'linear' and self.closed_form_linear:
+            return 'linear_equilibrium'
+        return 'relaxation'
+
+    def relaxation_settings(self):
+        """Selects the hooks of the relaxation loop (see `relax()`) from the inference settings. The settings combine freely, except:
+            - `update_order` other than 'jacobi' requires a solver with independent layer steps (not 'anderson'), and is not combined with `stacked_inference`
+            - compiled backends (`inference_backend`) run the 'gd' solver with 'jacobi' order on dense layers, without stacked or sparse products or `residual_tolerance`
+            - `sync_free_inference` (implied by compiled backends) requires a solver that adapts on the device ('gd', 'per_sample'), and is not combined with `per_sample_convergence`, which compacts the batch on the host
+
+        Returns:
+            - Dictionary of the hooks used: 'order', 'stacked', 'compiled', 'sync_free', 'per_sample', 'incremental' (interval), 'residual' (tolerance) and 'wavefront' (skip the layers the errors have not reached yet)
+            - List of (setting, reason) of the settings ignored
+        """
+        solver = self.relaxation_solver
+        ignored = []
+
+        order = self.update_order
+        if order != 'jacobi' and not solver.layerwise:
+            ignored.append(('update_order', f"the '{self.solver}' solver updates all hidden layers together"))
+            order = 'jacobi'
+
+        stacked = self.stacked_inference and self.w_stack is not None
+        if stacked and order != 'jacobi':
+            ignored.append(('stacked_inference', "the batched products update all hidden layers together ('jacobi' order)"))
+            stacked = False
+
+        compiled = self.inference_backend != 'eager'
+        if compiled and (self.solver != 'gd' or order != 'jacobi' or stacked or self.layer_ops or self.sparse_threshold is not None or self.residual_tolerance > 0):
+            ignored.append(('inference_backend', "compiled iterations support the 'gd' solver with 'jacobi' order on dense layers, without stacked or sparse products or residual tolerance"))
+            compiled = False
+
+        # Compiled backends evaluate the stopping criteria on the device
+        sync_free = self.sync_free_inference or compiled
+        if sync_free and self.per_sample_convergence:
+            if self.sync_free_inference:
+                ignored.append(('sync_free_inference', "per-sample convergence compacts the batch on the host"))
+            sync_free = False
+        if sync_free and not solver.device_feedback:
+            if self.sync_free_inference:
+                ignored.append(('sync_free_inference', f"the '{self.solver}' solver adapts on the host"))
+            sync_free = False
+
+        settings = {
+            'order': order,
+            'stacked': stacked,
+            'compiled': compiled,
+            'sync_free': sync_free,
+            'per_sample': self.per_sample_convergence,
+            'incremental': self.incremental_update_interval,
+            'residual': self.residual_tolerance,
+            'wavefront': order == 'jacobi' and solver.layerwise and not (stacked or compiled or sync_free)
+        }
+        return settings, ignored
+
+    def get_workspace(self, batch_size):
+        """Returns the preallocated buffers used by `inference()`, `gradients()` and `update_weights()` to update the network in place. A workspace is created once for each batch size and architecture, so the eager relaxation iterations perform no tensor allocations after the first batch (measured with `util.count_allocations()` in `benchmarks/allocations.py`). The number of buffers allocated is counted in `self.workspace_allocations`
+
+        Remarks:
+            - The tensors returned by `relax()`, `inference(copy=False)` and `gradients()` are workspace buffers, owned by the network and overwritten by the next call with the same batch size
+            - Only the workspaces of the `self.max_workspaces` most recently used batch sizes are kept. Batch sizes that alternate beyond this limit allocate their workspace again
+            - The iterations still allocate with the 'anderson' solver, compiled backends (`inference_backend`), per-sample compaction (when samples converge) and incremental weight updates (the optimizer)
+
+        Args:
+            batch_size: number of samples of the batch
+
+        Returns:
+            A dictionary of buffers, indexed by name and then by layer
+        """
+        key = (batch_size, tuple(self.neurons), self.compute_dtype)
+        if key in self.workspaces:
+            self.workspaces.move_to_end(key)
+            return self.workspaces[key]
+
+        def buffer(*shape, dtype=self.compute_dtype):
+            self.workspace_allocations += 1
+            return torch.empty(*shape, dtype=dtype, device=PcTorch.device)
+
+        ws = {'x': {}, 'e': {}, 'fx': {}, 'dfx': {}, 'g': {}, 'square': {}, 'error': {}, 'previous': {}, 'dw': {}, 'db': {}}
         for l in range(1,self.n_layers):
-            fx = self.F(x[l-1])
-            e[l] = x[l] - torch.matmul(self.w[l-1], fx ) - self.b[l-1]
-            previous_error += torch.square(torch.sum(e[l], 0))
+            ws['e'][l] = buffer(self.neurons[l], batch_size)
+            ws['square'][l] = buffer(self.neurons[l], batch_size)
+            ws['error'][l] = buffer(batch_size)
+            ws['previous'][l] = buffer(batch_size)
+
+        for l in range(1,self.n_layers-1):
+            ws['x'][l] = buffer(self.neurons[l], batch_size)
+            ws['fx'][l] = buffer(self.neurons[l], batch_size)
+            ws['dfx'][l] = buffer(self.neurons[l], batch_size)
+            ws['g'][l] = buffer(self.neurons[l], batch_size)
+
+        for l in range(self.n_layers-1):
+            ws['db'][l] = buffer(self.neurons[l+1], 1)
+            if l > 0 or self.input_rank is None:
+                ws['dw'][l] = buffer(*self.weight_shape(l))
+
+        # Gradients of the factors of the input layer, see `gradients()`
+        if self.input_rank is not None:
+            ws['du'] = buffer(self.neurons[1], self.input_rank)
+            ws['dv'] = buffer(self.input_rank, self.neurons[0])
+            ws['ue'] = buffer(self.input_rank, batch_size)
+
+        ws['column'] = buffer(batch_size)
+        ws['current_error'] = buffer(batch_size)
+        ws['previous_error'] = buffer(batch_size)
+        ws['increased'] = buffer(batch_size, dtype=torch.bool)
+        ws['count'] = buffer((), dtype=torch.long)
+        ws['mean'] = buffer(())
+        ws['residual'] = buffer(batch_size)
+        ws['rate'] = buffer(())
+        ws['mean_residual'] = buffer(())
+        ws['flag'] = buffer((), dtype=torch.bool)
+        ws['converged'] = buffer(batch_size, dtype=torch.bool)
+        ws['indicator'] = buffer(batch_size, dtype=torch.long)
+        ws['inverse_width'] = buffer(())
+        ws['min_error'] = buffer(())
+        ws['tolerance'] = buffer(())
+        ws['empty'] = buffer(0)
+
+        # Batched products of the hidden-to-hidden layers, see `descent_directions()` and `refresh_errors()`
+        if self.w_stack is not None:
+            ws['stack_in'] = buffer(self.n_layers-3, self.neurons[1], batch_size)
+            ws['stack_out'] = buffer(self.n_layers-3, self.neurons[1], batch_size)
+
+        # Least recently used batch sizes are released (e.g. the last, smaller batch of an epoch and the validation batches)
+        self.workspaces[key] = ws
+        while len(self.workspaces) > max(self.max_workspaces, 1):
+            self.workspaces.popitem(last=False)
+        return ws
+
+    def inference_fixed_prediction(self, x):
+        """Performs (batch) inference under the fixed prediction assumption (Whittington & Bogacz, 2017): the predictions are held at their feedforward values, so the equilibrium errors are obtained layer by layer from the output, in `n_layers-1` steps, and match the errors of backpropagation
+
+        e[L] = x[L] - w[L-1]F(x[L-1]) - b[L-1] 
+        e[l] = (w[l]^T e[l+1]) * dF(x[l])
+        
+        Args: 
+            x: neuron activations for each layer (batch form), with the feedforward values in the hidden layers
+
+        Returns:
+            The activations (hidden layers keep the feedforward values, used by the weight update) and layer-wise error neurons (batch form)
+        """
+        out_layer = self.n_layers-1
+
+        w, b = self.weights(out_layer-1)
+        e = {out_layer: x[out_layer] - torch.matmul(w, self.F(x[out_layer-1])) - b}
+        for l in range(out_layer-1, 0, -1):
+            w, _ = self.weights(l)
+            e[l] = torch.matmul(w.transpose(1,0), e[l+1]) * self.dF(x[l])
+
+        self.inference_steps = out_layer
+        self.inference_error_change = 0.0 # exact, not iterative
+        return x, e
+
+    def inference_linear_equilibrium(self, x):
+        """Computes the inference equilibrium of a network with linear activation in one shot. The energy is then quadratic in the hidden states, and its minimum solves the block-tridiagonal linear system (for each hidden layer l)
+
+        (I + w[l]^T w[l]) x[l] - w[l-1] x[l-1] - w[l]^T x[l+1] = b[l-1] - w[l]^T b[l]
+
+        where x[0] and x[L] are clamped (moved to the right hand side). The system matrix is the same for all samples of the batch, so the batch is solved as multiple right hand sides: with a Cholesky factorization for up to `self.direct_solver_max_neurons` hidden neurons, or with (batched) conjugate gradient otherwise
+        
+        Args: 
+            x: neuron activations for each layer (batch form)
+
+        Returns:
+            The (equilibrium) activations and layer-wise error neurons (batch form)
+        """
+        out_layer = self.n_layers-1
+        hidden = range(1,out_layer)
+
+        w = {}
+        b = {}
+        for l in hidden:
+            w[l], b[l] = self.weights(l)
+        _, mu1 = self.input_projection(x[0])
+
+        # Right hand side (the bias terms of the middle layers are expanded to the batch width)
+        batch_size = x[out_layer].shape[1]
+        rhs = {}
+        for l in hidden:
+            rhs[l] = ((mu1 if l == 1 else b[l-1]) - torch.matmul(w[l].transpose(1,0), b[l])).expand(-1, batch_size)
+        rhs[out_layer-1] = rhs[out_layer-1] + torch.matmul(w[out_layer-1].transpose(1,0), x[out_layer])
+
+        if sum(self.neurons[1:out_layer]) <= self.direct_solver_max_neurons:
+            solution = self.solve_linear_direct(w, rhs)
+        else:
+            solution = self.solve_linear_cg(w, rhs, {l:x[l] for l in hidden})
+
+        for l in hidden:
+            x[l] = solution[l]
+
+        e, _ = self.layer_errors(x, mu1, w, b)
+        self.inference_steps = 1
+        self.inference_error_change = 0.0 # equilibrium solved directly
+        return x, e
+
+    def solve_linear_direct(self, w, rhs):
+        """Solves the linear network equilibrium system (see `inference_linear_equilibrium()`) with a Cholesky factorization of the assembled system matrix
+
+        Args:
+            w: weights of the layers 1...n_layers-2, with the compute precision
+            rhs: right hand side of each hidden layer (batch form)
+
+        Returns:
+            The hidden states (batch form)
+        """
+        out_layer = self.n_layers-1
+        offsets = {}
+        total = 0
+        for l in range(1,out_layer):
+            offsets[l] = (total, total+self.neurons[l])
+            total += self.neurons[l]
+
+        A = torch.zeros(total, total, dtype=self.compute_dtype, device=PcTorch.device)
+        for l in range(1,out_layer):
+            start, end = offsets[l]
+            A[start:end, start:end] = torch.eye(end-start, dtype=self.compute_dtype, device=PcTorch.device) + torch.matmul(w[l].transpose(1,0), w[l])
+            if l+1 < out_layer:
+                next_start, next_end = offsets[l+1]
+                A[start:end, next_start:next_end] = -w[l].transpose(1,0)
+                A[next_start:next_end, start:end] = -w[l]
+
+        L = torch.linalg.cholesky(A)
+        solution = torch.cholesky_solve(torch.cat([rhs[l] for l in range(1,out_layer)], 0), L)
+
+        return {l:solution[start:end] for l, (start, end) in offsets.items()}
+
+    def solve_linear_cg(self, w, rhs, x0):
+        """Solves the linear network equilibrium system (see `inference_linear_equilibrium()`) with conjugate gradient, without assembling the system matrix. Each sample (column) is solved independently, in batch
+
+        Args:
+            w: weights of the layers 1...n_layers-2, with the compute precision
+            rhs: right hand side of each hidden layer (batch form)
+            x0: initial hidden states (batch form)
+
+        Returns:
+            The hidden states (batch form)
+        """
+        out_layer = self.n_layers-1
+        hidden = range(1,out_layer)
+
+        def operator(v):
+            Av = {}
+            for l in hidden:
+                Av[l] = v[l] + torch.matmul(w[l].transpose(1,0), torch.matmul(w[l], v[l]))
+                if l > 1:
+                    Av[l] = Av[l] - torch.matmul(w[l-1], v[l-1])
+                if l+1 < out_layer:
+                    Av[l] = Av[l] - torch.matmul(w[l].transpose(1,0), v[l+1])
+            return Av
+
+        def dot(u, v):
+            return sum(torch.sum(u[l]*v[l], 0) for l in hidden)
+
+        x = dict(x0)
+        Ax = operator(x)
+        r = {l:rhs[l] - Ax[l] for l in hidden}
+        p = dict(r)
+        rs = dot(r, r)
+        tolerance = (self.cg_tolerance**2) * dot(rhs, rhs)
+
+        for i in range(sum(self.neurons[1:out_layer])):
+            if torch.all(rs <= tolerance).item():
+                break
+
+            Ap = operator(p)
+            alpha = rs / dot(p, Ap).clamp_min(1e-30)
+            for l in hidden:
+                x[l] = x[l] + alpha*p[l]
+                r[l] = r[l] - alpha*Ap[l]
+
+            rs_new = dot(r, r)
+            beta = rs_new / rs.clamp_min(1e-30)
+            for l in hidden:
+                p[l] = r[l] + beta*p[l]
+            rs = rs_new
+
+        return x
+
+    def relax(self, x):
+        """Performs (batch) inference by relaxing the hidden states: each iteration moves the states along the descent direction of the energy and recomputes the errors, halving the update rate when more than 1 sample error increases, until the mean error difference is below `self.min_inference_error` or `self.max_it` iterations. The loop is shared by all inference settings, which plug in as hooks (see `relaxation_settings()`):
+            - state update: order of the hidden layer updates (`update_order`, errors next to an updated layer are refreshed immediately), batched products of equal hidden layers (`stacked_inference`), relaxation solver (`solver`, see `snn/solvers.py`) or compiled iteration (`inference_backend`, see `snn/kernels.py`)
+            - convergence: mean residual norm below `residual_tolerance`, per-sample convergence with compaction of the batch (`per_sample_convergence`), or criteria evaluated on the device (`sync_free_inference`)
+            - weight updates every `incremental_update_interval` iterations (incremental predictive coding). The last weight update of the batch is left to the caller, as in the normal training schedule
+
+        With the default settings, all intermediate values are written in place into the workspace buffers, and the layers the errors have not reached yet are skipped (right after feedforward only the output layer has errors, and the error wavefront moves down one layer per iteration)
+        
+        Args: 
+            x: neuron activations for each layer (batch form)
+
+        Returns:
+            The (relaxed) activations and layer-wise error neurons (batch form). Hidden activations and errors are workspace buffers (see `get_workspace()`)
+
+        Remarks:
+            - The number of iterations is stored in `self.inference_steps`, and the mean error difference of the last iteration in `self.inference_error_change`. With `per_sample_convergence`, the iterations of each sample (up to and including the iteration where it last converged, so the largest count is `self.inference_steps`) are stored in `self.inference_iterations` and their histogram in `self.iterations_histogram`
+            - With `sync_free_inference`, converged states are frozen (zero steps) instead of leaving the loop, and the host only checks whether it can stop early every `convergence_check_interval` iterations (never, if 0) and before incremental weight updates. Frozen iterations are not counted
+        """
+        settings, _ = self.relaxation_settings()
+        solver = self.relaxation_solver
+
+        s = self.relaxation_state(x, settings)
+        ws = s['ws']
+        batch_size = s['width']
+
+        # Thresholds of the convergence criteria, as tensors
+        ws['min_error'].fill_(self.min_inference_error)
+        ws['tolerance'].fill_(settings['residual'])
+
+        sync_free = settings['sync_free']
+        solver.reset(self.beta, like=ws['mean'] if sync_free else None)
+        if sync_free:
+            s['running'] = torch.ones((), dtype=torch.bool, device=PcTorch.device)
+            s['scale'] = torch.ones((), dtype=self.compute_dtype, device=PcTorch.device)
+            steps = torch.zeros((), dtype=self.compute_dtype, device=PcTorch.device) # iterations performed before the state was frozen
+
+        iterations = None
+        if settings['per_sample']:
+            s['active'] = torch.arange(batch_size, device=PcTorch.device)
+            iterations = torch.zeros(batch_size, dtype=torch.long, device=PcTorch.device)
+
+        self.inference_residual = None
 
         # Inference loop
         for i in range(self.max_it):
-            current_error = torch.zeros(self.batch_size, dtype=PcTorch.dtype, device=PcTorch.device)
-
-            # Update X
-            for l in range(1,self.n_layers-1): # do not alter output (labels) layer 
-                dfx = self.dF(x[l])
-                g = torch.matmul( self.w[l].transpose(1,0) , e[l+1] ) * dfx
-                x[l] = x[l] + update_rate*(g - e[l])
-
-            # Update E 
-            for l in range(1, self.n_layers):
-                e[l] = x[l] - torch.matmul( self.w[l-1], self.F(x[l-1])) - self.b[l-1]
-                current_error += torch.sum(torch.square(e[l]), 0)
-
-            # Check if more than 1 error increased after inference
-            if torch.gt( current_error, previous_error ).sum()>1:
-                update_rate = update_rate/2 # decrease update rate
-            
+
+            # Incremental predictive coding: update the weights, and the predictions and errors with the new weights
+            if settings['incremental'] > 0 and i > 0 and i % settings['incremental'] == 0:
+                if sync_free and not s['running'].item():
+                    break
+                self.relaxation_weight_update(s, settings)
+
+            if sync_free:
+                steps += s['scale'].copy_(s['running'])
+
+            # Update X and E
+            if settings['compiled']:
+                self.compiled_iteration(s)
+            else:
+                self.relaxation_iteration(s, settings)
+
+            # Means over the active samples (sum and product: the reductions and python scalar operands would allocate)
+            width = s['width']
+            ws['inverse_width'].fill_(1/width)
+            column = self.workspace_columns(ws['column'], width)
+            increased = self.workspace_columns(ws['increased'], width)
+            current_error, previous_error = s['total'], s['previous_total']
+
+            # Check if more than 1 error increased after inference (the solver decreases its update rate)
+            torch.gt(current_error, previous_error, out=increased)
+            indicator = self.workspace_columns(ws['indicator'], width).copy_(increased)
+            torch.sum(indicator, 0, out=ws['count'])
+            solver.feedback(increased, ws['count'], s['previous'], s['error'])
+
             # Check if minimum error difference condition has been met
-            if torch.abs(torch.mean(current_error - previous_error)) < self.min_inference_error:
-                break
+            torch.sub(current_error, previous_error, out=column)
+            change = torch.sum(column, 0, out=ws['mean']).mul_(ws['inverse_width']).abs_()
+            residual = None
+            mean_residual = None
+            if settings['residual'] > 0:
+                residual = self.workspace_columns(ws['residual'], width).sqrt_()
+                mean_residual = torch.sum(residual, 0, out=ws['mean_residual']).mul_(ws['inverse_width'])
+
+            converged = None
+            if settings['per_sample']:
+                # Converged samples are written back and removed from the batch (`increased` is free after the solver feedback)
+                self.inference_error_change = change.item()
+                converged = torch.lt(column.abs_(), ws['min_error'], out=self.workspace_columns(ws['converged'], width))
+                if residual is not None:
+                    self.inference_residual = mean_residual.item()
+                    converged.logical_or_(torch.lt(residual, ws['tolerance'], out=increased))
+            elif sync_free:
+                s['running'].logical_and_(torch.ge(change, ws['min_error'], out=ws['flag']))
+                if residual is not None:
+                    s['running'].logical_and_(torch.ge(mean_residual, ws['tolerance'], out=ws['flag']))
+                if self.convergence_check_interval > 0 and (i+1) % self.convergence_check_interval == 0:
+                    if not s['running'].item():
+                        break
+            else:
+                self.inference_error_change = change.item()
+                if residual is not None:
+                    self.inference_residual = mean_residual.item()
+                    if self.inference_residual < settings['residual']:
+                        self.inference_error_change = 0.0 # converged (residual criterion)
+                        break
+                if self.inference_error_change < self.min_inference_error:
+                    break
+
+            s['previous'], s['error'] = s['error'], s['previous']
+            s['previous_total'], s['total'] = s['total'], s['previous_total']
+
+            if converged is not None and torch.any(converged, out=ws['flag']).item():
+                iterations[s['active'][converged]] = i+1
+                self.compact_relaxation_state(s, converged)
+                if s['width'] == 0:
+                    break
+
+        self.inference_steps = i+1
+        if iterations is not None and s['width'] > 0:
+            iterations[s['active']] = self.inference_steps
+        if sync_free:
+            # Frozen iterations are not counted
+            self.inference_steps = int(steps.item())
+            self.inference_error_change = ws['mean'].item()
+
+        self.inference_iterations = iterations
+        self.iterations_histogram = None
+        if iterations is not None:
+            self.iterations_histogram = torch.bincount(iterations, minlength=self.max_it+1)
+
+        return self.relaxation_results(x, s)
+
+    def relaxation_state(self, x, settings):
+        """Creates the state of the relaxation loop of `relax()`: the hidden states are copied into the workspace (leaving the feedforward values untouched), and the initial errors are computed
+
+        Returns:
+            A dictionary with the states 'x', errors 'e', activations 'fx' and derivatives 'dfx' of the active samples, indexed by layer, the weights and the per-sample errors (see `relaxation_errors()`)
+        """
+        out_layer = self.n_layers-1
+        batch_size = x[0].shape[1]
+        ws = self.get_workspace(batch_size)
+
+        s = {
+            'ws': ws,
+            'width': batch_size, # number of active samples
+            'active': None, # dataset columns of the active samples (per-sample convergence)
+            'compacted': False,
+            'running': None, # sync-free inference: 0-dim boolean tensor, False once the stopping criteria have been met
+            'scale': None, # sync-free inference: `running` with the compute precision, multiplies the steps
+            'labels': x[out_layer],
+            'x': {0: x[0], out_layer: x[out_layer]},
+            'e': dict(ws['e']),
+            'fx': {},
+            'dfx': {}
+        }
+
+        # F(x) and dF(x) are computed together once per state update and cached (see `cached_activation()`),
+        # reusing F(x) from feedforward() when available
+        for l in range(1,out_layer):
+            cached = self.cached_activation(x, l)
+            ws['x'][l].copy_(x[l])
+            s['x'][l] = ws['x'][l]
+            s['fx'][l] = ws['fx'][l]
+            s['dfx'][l] = ws['dfx'][l]
+            if cached is None:
+                self.FdF(s['x'][l], out=s['fx'][l], dout=s['dfx'][l])
+            else:
+                s['fx'][l].copy_(cached)
+                self.dF_from_F(s['x'][l], s['fx'][l], out=s['dfx'][l])
+            self.store_activation(s['x'], l, s['fx'][l], s['dfx'][l])
+
+        self.relaxation_weights(s, settings)
+        self.relaxation_errors(s, settings)
+        return s
+
+    def relaxation_weights(self, s, settings):
+        """Stores the weights with the compute precision in the relaxation state (see `relax()`), and the prediction of the first hidden layer by the clamped input layer, which is computed once per batch
+        """
+        s['w'] = {}
+        s['b'] = {}
+        for l in range(1,self.n_layers-1):
+            s['w'][l], s['b'][l] = self.weights(l)
+
+        if settings['stacked']:
+            s['w_stack'] = self.w_stack.to(self.compute_dtype) # [layers, neurons, neurons]
+            s['b_stack'] = self.b_stack.to(self.compute_dtype) # [layers, neurons, 1]
+
+        _, s['mu1'] = self.input_projection(s['x'][0])
+
+    def relaxation_errors(self, s, settings):
+        """Calculates the initial errors of the relaxation state (see `relax()`), and the per-sample error of each layer (square of the sum of the error neurons) that the first iteration is compared with
+        """
+        ws = s['ws']
+        x = s['x']
+        e = s['e']
+        w = s['w']
+        b = s['b']
+
+        # Calculate initial error neuron values: 
+        # e[l] (x[l]-mu[l])/variance : assume variance is 1 
+        # Predictions are computed as in feedforward(), so the errors of feedforward states are exactly zero
+        torch.sub(x[1], s['mu1'], out=e[1])
+        for l in range(2,self.n_layers):
+            torch.sub(x[l], self.activation_product(w[l-1], s['fx'][l-1], l-1) + b[l-1], out=e[l])
+
+        s['error'] = dict(ws['error'])
+        s['previous'] = dict(ws['previous'])
+        s['total'] = ws['current_error']
+        s['previous_total'] = ws['previous_error']
+        s['previous_total'].zero_()
+        for l in range(1,self.n_layers):
+            s['error'][l].zero_()
+            torch.sum(e[l], 0, out=s['previous'][l]).square_()
+            s['previous_total'].add_(s['previous'][l])
+
+        # Error wavefront: lowest layer with non-zero errors. Layers below it have zero errors and
+        # unchanged states, so they are skipped
+        s['front'] = 1
+        if settings['wavefront']:
+            s['front'] = self.n_layers-1
+            for l in range(1,self.n_layers):
+                if torch.any(e[l]).item():
+                    s['front'] = l
+                    break
+
+    def relaxation_phases(self, order, first):
+        """Returns the groups of hidden layers updated together in an iteration of `relax()`, in update order:
+            - 'jacobi': all layers from the errors of the previous iteration
+            - 'gauss_seidel_up': one layer at a time, from the input to the output
+            - 'gauss_seidel_down': one layer at a time, from the output to the input
+            - 'red_black': odd layers together, then even layers together
+
+        Args:
+            order: update order (`self.update_order`)
+            first: lowest hidden layer updated
+        """
+        hidden = list(range(first,self.n_layers-1))
+        if order == 'gauss_seidel_up':
+            return [[l] for l in hidden]
+        if order == 'gauss_seidel_down':
+            return [[l] for l in reversed(hidden)]
+        if order == 'red_black':
+            return [phase for phase in [hidden[0::2], hidden[1::2]] if phase]
+        return [hidden]
+
+    def relaxation_iteration(self, s, settings):
+        """Performs an iteration of `relax()` (eager): for each phase of the update order, calculates the descent direction of the layers, updates their states with the solver and refreshes the errors next to them. Then calculates the per-sample errors
+        """
+        ws = s['ws']
+        width = s['width']
+        residual = self.workspace_columns(ws['residual'], width) if settings['residual'] > 0 else None
+
+        first = max(1, s['front']-1) if settings['wavefront'] else 1 # lowest layer changed by this iteration
+        if residual is not None:
+            residual.zero_()
+
+        for phase in self.relaxation_phases(settings['order'], first):
+            dx = self.descent_directions(s, phase, settings)
+
+            # Residual: norm of the descent direction of the hidden layers
+            if residual is not None:
+                for l in phase:
+                    square = self.workspace_columns(ws['square'][l], width)
+                    torch.mul(dx[l], dx[l], out=square)
+                    residual.add_(torch.sum(square, 0, out=self.workspace_columns(ws['column'], width)))
+
+            # Frozen states (sync-free inference) are not updated
+            if s['scale'] is not None:
+                for l in phase:
+                    dx[l].mul_(s['scale'])
+
+            self.relaxation_solver.step(s['x'], dx)
+            for l in phase:
+                self.FdF(s['x'][l], out=s['fx'][l], dout=s['dfx'][l])
+
+            self.refresh_errors(s, sorted(set(phase + [l+1 for l in phase])), settings)
+
+        s['front'] = first
+
+        # Per-sample error: sum of squares of the error neurons
+        total = s['total']
+        total.zero_()
+        for l in range(first, self.n_layers):
+            square = self.workspace_columns(ws['square'][l], width)
+            torch.mul(s['e'][l], s['e'][l], out=square)
+            torch.sum(square, 0, out=s['error'][l])
+            total.add_(s['error'][l])
+
+    def descent_directions(self, s, layers, settings):
+        """Calculates the descent direction of the energy dx[l] = (w[l]^T e[l+1]) * dF(x[l]) - e[l] of the hidden layers `layers`, in workspace buffers. With `stacked_inference`, the feedback of the hidden-to-hidden layers is a single batched matrix multiplication, when all hidden layers are updated together
+
+        Returns:
+            Dictionary of the descent directions, indexed by layer
+        """
+        ws = s['ws']
+        width = s['width']
+        out_layer = self.n_layers-1
+        e = s['e']
+
+        dx = {}
+        remaining = layers
+        if settings['stacked'] and len(layers) == out_layer-1:
+            E = self.workspace_columns(ws['stack_in'], width) # [layers, neurons, batch_size]
+            G = self.workspace_columns(ws['stack_out'], width)
+            torch.stack([e[l] for l in range(2,out_layer)], out=E)
+            torch.bmm(s['w_stack'].transpose(1,2), E, out=G)
+            for l in range(1,out_layer-1):
+                dx[l] = G[l-1]
+            remaining = [out_layer-1]
+
+        for l in remaining:
+            dx[l] = self.error_feedback(s['w'][l], e[l+1], l, out=self.workspace_columns(ws['g'][l], width))
+
+        for l in layers:
+            dx[l].mul_(s['dfx'][l]).sub_(e[l])
+        return dx
+
+    def refresh_errors(self, s, layers, settings):
+        """Recalculates the error neurons of `layers` in place, after their states or the states of the layers below have been updated. With `stacked_inference`, the predictions of the hidden-to-hidden layers are a single batched matrix multiplication, when all of them are refreshed
+        """
+        ws = s['ws']
+        width = s['width']
+        out_layer = self.n_layers-1
+        x = s['x']
+        e = s['e']
+        fx = s['fx']
+        w = s['w']
+        b = s['b']
+
+        stacked = range(2,out_layer)
+        if settings['stacked'] and all(l in layers for l in stacked):
+            FX = self.workspace_columns(ws['stack_in'], width) # [layers, neurons, batch_size]
+            P = self.workspace_columns(ws['stack_out'], width)
+            torch.stack([fx[l-1] for l in stacked], out=FX)
+            torch.baddbmm(s['b_stack'], s['w_stack'], FX, out=P)
+            for l in stacked:
+                torch.sub(x[l], P[l-2], out=e[l])
+            layers = [l for l in layers if l not in stacked]
+
+        for l in layers:
+            if l == 1:
+                torch.sub(x[1], s['mu1'], out=e[1])
+            elif self.sparse_threshold is None and l-1 not in self.layer_ops:
+                torch.addmm(b[l-1], w[l-1], fx[l-1], beta=-1, alpha=-1, out=e[l])
+                e[l].add_(x[l])
+            else:
+                torch.sub(x[l], self.activation_product(w[l-1], fx[l-1], l-1) + b[l-1], out=e[l])
+
+    def compiled_iteration(self, s):
+        """Performs an iteration of `relax()` with `kernels.relaxation_step()`, compiled with `self.inference_backend`
+        """
+        ws = s['ws']
+        empty = ws['empty']
+        n_layers = self.n_layers
+
+        # Layer-indexed lists for the relaxation kernel (unused entries are empty)
+        xs = [empty] + [s['x'][l] for l in range(1,n_layers)]
+        es = [empty] + [s['e'][l] for l in range(1,n_layers)]
+        fx = [empty] + [s['fx'][l] for l in range(1,n_layers-1)] + [empty]
+        dfx = [empty] + [s['dfx'][l] for l in range(1,n_layers-1)] + [empty]
+        w = [empty] + [s['w'][l] for l in range(1,n_layers-1)]
+        b = [empty] + [s['b'][l] for l in range(1,n_layers-1)]
+
+        rate = self.relaxation_solver.update_rate
+        if s['scale'] is not None:
+            rate = torch.mul(rate, s['scale'], out=ws['rate']) # frozen states are not updated
+        elif not torch.is_tensor(rate):
+            rate = ws['rate'].fill_(rate)
+
+        xs, es, fx, dfx, s['total'] = self.relaxation_kernel(xs, es, fx, dfx, s['mu1'], w, b, rate, self.activation)
+        for l in range(1,n_layers):
+            s['x'][l] = xs[l]
+            s['e'][l] = es[l]
+            if l < n_layers-1:
+                s['fx'][l] = fx[l]
+                s['dfx'][l] = dfx[l]
+
+        # Per-layer errors are not computed by the kernel
+        s['error'] = None
+        s['previous'] = None
+
+    def relaxation_weight_update(self, s, settings):
+        """Incremental predictive coding (see `relax()`): updates the weights with the current states and errors of the whole batch (converged samples are active again), then recomputes the predictions and errors with the new weights
+        """
+        ws = s['ws']
+        if s['compacted']:
+            self.expand_relaxation_state(s)
+
+        self.update_weights(s['x'], s['e'])
+
+        self.relaxation_weights(s, settings)
+        for l in range(1,self.n_layers-1):
+            self.FdF(s['x'][l], out=s['fx'][l], dout=s['dfx'][l])
+            self.store_activation(s['x'], l, s['fx'][l], s['dfx'][l])
+        if s['e'][1] is not ws['e'][1]:
+            s['e'] = dict(ws['e']) # compiled iterations
+        self.relaxation_errors(s, settings)
+        self.relaxation_solver.restart()
+
+    def compact_relaxation_state(self, s, converged):
+        """Per-sample convergence: writes the states and errors of the converged samples to the results (the full-batch workspace buffers), and removes them from the active samples of the relaxation state, so the computation shrinks as samples settle
+
+        Args:
+            s: relaxation state (see `relax()`), after the current and previous errors have been swapped
+            converged: boolean tensor, converged active samples
+        """
+        ws = s['ws']
+        out_layer = self.n_layers-1
+
+        done = s['active'][converged]
+        for l in range(1,self.n_layers):
+            if l < out_layer:
+                ws['x'][l][:, done] = s['x'][l][:, converged]
+            ws['e'][l][:, done] = s['e'][l][:, converged]
+
+        keep = torch.logical_not(converged)
+        s['active'] = s['active'][keep]
+        s['width'] = width = s['active'].shape[0]
+        s['compacted'] = True
+        if width == 0:
+            return
+
+        # Active samples, in compacted form
+        for l in range(1,self.n_layers):
+            s['x'][l] = s['x'][l][:, keep]
+            s['e'][l] = s['e'][l][:, keep]
+            if l < out_layer:
+                s['fx'][l] = s['fx'][l][:, keep]
+                s['dfx'][l] = s['dfx'][l][:, keep]
+        s['mu1'] = s['mu1'][:, keep]
+
+        s['previous_total'] = s['previous_total'][keep]
+        s['total'] = self.workspace_columns(ws['current_error'], width)
+        if s['previous'] is not None:
+            s['previous'] = {l:s['previous'][l][keep] for l in s['previous']}
+            s['error'] = {l:self.workspace_columns(ws['error'][l], width) for l in ws['error']}
+
+        self.relaxation_solver.compact(keep)
+
+    def expand_relaxation_state(self, s):
+        """Per-sample convergence: writes the active samples to the results, and makes all samples active again (with the full-batch workspace buffers)
+        """
+        ws = s['ws']
+        out_layer = self.n_layers-1
+
+        self.write_active_samples(s)
+        for l in range(1,out_layer):
+            s['x'][l] = ws['x'][l]
+            s['fx'][l] = ws['fx'][l]
+            s['dfx'][l] = ws['dfx'][l]
+        s['x'][out_layer] = s['labels']
+        s['e'] = dict(ws['e'])
+
+        s['active'] = torch.arange(ws['column'].shape[0], device=PcTorch.device)
+        s['width'] = s['active'].shape[0]
+        s['compacted'] = False
+
+    def write_active_samples(self, s):
+        """Per-sample convergence: writes the states and errors of the active samples to the results
+        """
+        if s['width'] == 0:
+            return
+
+        ws = s['ws']
+        active = s['active']
+        for l in range(1,self.n_layers):
+            if l < self.n_layers-1:
+                ws['x'][l][:, active] = s['x'][l]
+            ws['e'][l][:, active] = s['e'][l]
+
+    def relaxation_results(self, x, s):
+        """Returns the activations and errors of the relaxation state for the whole batch (see `relax()`), and caches the activations of the hidden layers
+        """
+        ws = s['ws']
+        out_layer = self.n_layers-1
+
+        if not s['compacted']:
+            for l in range(1,out_layer):
+                x[l] = s['x'][l]
+                self.store_activation(x, l, s['fx'][l], s['dfx'][l])
+            return x, {l:s['e'][l] for l in range(1,self.n_layers)}
+
+        # The activations of the compacted samples are not kept for the whole batch
+        self.write_active_samples(s)
+        self.clear_activation_cache()
+        for l in range(1,out_layer):
+            x[l] = ws['x'][l]
+        return x, dict(ws['e'])
+
+    @staticmethod
+    def workspace_columns(buffer, width):
+        """Returns a contiguous view of the first elements of a workspace buffer, with the last dimension (samples) reduced to `width` active samples. Used as scratch space once the batch is compacted (see `compact_relaxation_state()`)
+        """
+        if buffer.shape[-1] == width:
+            return buffer
+        shape = torch.Size(buffer.shape[:-1] + (width,))
+        return buffer.view(-1)[:shape.numel()].view(shape)
+
+    def layer_errors(self, x, mu1, w, b):
+        """Calculates the error neurons of all layers
+
+        Args:
+            x: neuron activations for each layer (batch form)
+            mu1: prediction of the first hidden layer by the input layer
+            w: weights of the layers 1...n_layers-2, with the compute precision
+            b: biases of the layers 1...n_layers-2, with the compute precision
+
+        Returns:
+            - The error neurons of each layer (batch form)
+            - The per-sample error (sum of squares) of each layer
+        """
+        e = {l:self.layer_error(l, x, mu1, w, b) for l in range(1,self.n_layers)}
+
+        return e, {l:torch.sum(torch.square(e[l]), 0) for l in e}
+
+    def layer_error(self, l, x, mu1, w, b):
+        """Calculates the error neurons of layer `l` (arguments as in `layer_errors()`)
+        """
+        if l == 1:
+            return x[1] - mu1
+        return x[l] - self.activation_product(w[l-1], self.F(x[l-1]), l-1) - b[l-1]
+
+    def set_state_cache(self, max_samples, precision='float16', filename=None):
+        """Enables the warm start of inference: the converged hidden states of each training sample are stored, and the next inference of the same sample starts from them instead of from the feedforward values
+
+        Args:
+            max_samples: maximum number of samples stored (least recently used samples are evicted). Use 0 to disable the cache
+            precision: storage precision of the states, 'float16' or 'float32'
+            filename: if given, the states are stored in a memory-mapped file instead of in memory
+        """
+        self.state_cache = None
+        if max_samples > 0:
+            self.state_cache = StateCache(self.neurons, max_samples, precision, filename)
+
+    def warm_start_inference(self, x, indices):
+        """Performs inference of a training batch, initializing the hidden layers from the state cache (if enabled) and storing the converged states back. Counts the iterations in `self.total_inference_steps`
+
+        Args: 
+            x: neuron activations for each layer (batch form)
+            indices: dataset index of each sample of the batch, or None
+
+        Returns:
+            The (relaxed) activations and layer-wise error neurons (batch form)
+        """
+        if self.state_cache is None or indices is None:
+            x,e = self.inference(x, copy=False)
+            self.observe_inference()
+            return x, e
+
+        hits = self.state_cache.get(indices, x)
+        x,e = self.inference(x, copy=False)
+        self.observe_inference()
+        self.state_cache.put(indices, x)
+
+        # Batches are counted as warm only if all samples were found in the cache
+        stats = 'warm' if hits == len(indices) else 'cold'
+        self.warm_start_stats[stats+'_batches'] += 1
+        self.warm_start_stats[stats+'_iterations'] += self.inference_steps
 
-            previous_error = current_error
         return x, e
 
+    def observe_inference(self):
+        """Records the iterations of the last inference of a training batch, and updates `max_it` if the adaptive iteration budget is enabled
+        """
+        self.total_inference_steps += self.inference_steps
+        if self.max_it_controller is not None:
+            self.max_it = self.max_it_controller.observe(self.inference_steps, self.inference_error_change)
+        self.inference_error_change = None
+
+    def set_max_it_controller(self, min_it=5, max_it=200, target_error_change=None, interval=100):
+        """Enables the adaptive iteration budget: `max_it` is adjusted every `interval` training batches from the observed convergence of inference (see `MaxItController`), starting from the current `max_it`. The chosen budgets are printed and stored in `self.max_it_controller.history`
+
+        Args:
+            min_it: minimum budget
+            max_it: maximum budget
+            target_error_change: mean error change at which inference is considered converged (default: `self.min_inference_error`)
+            interval: number of batches between budget updates (e.g. the number of batches of an epoch). Use 0 to disable the controller
+
+        Remarks:
+            - All inference methods (see `inference_method()`) record their iterations and final error change. The fixed-prediction and linear closed-form methods are not iterative, so the budget has no effect on them
+        """
+        self.max_it_controller = None
+        if interval > 0:
+            if target_error_change is None:
+                target_error_change = self.min_inference_error
+            self.max_it_controller = MaxItController(self.max_it, min_it, max_it, target_error_change, interval)
+
+    def set_max_it(self, max_it):
+        """Sets the maximum number of inference iterations. With the adaptive iteration budget (see `set_max_it_controller()`), the controller restarts from `max_it`, clamped to its limits
+        """
+        assert max_it >= 1
+        self.max_it = max_it
+        if self.max_it_controller is not None:
+            self.max_it = self.max_it_controller.restart(max_it)
+
+    def reset_warm_start_stats(self, keep_cold=False):
+        """Resets the inference iteration counts of warm and cold started batches (see `warm_start_inference()`)
+
+        Args:
+            keep_cold: keep the counts of cold started batches, which are the reference for the iterations saved. Used at every epoch, because after the first epoch all batches are warm started
+        """
+        cold_batches, cold_iterations = 0, 0
+        if keep_cold:
+            cold_batches = self.warm_start_stats['cold_batches']
+            cold_iterations = self.warm_start_stats['cold_iterations']
+
+        self.warm_start_stats = {'warm_batches': 0, 'warm_iterations': 0, 'cold_batches': cold_batches, 'cold_iterations': cold_iterations}
+
+    def print_warm_start_stats(self):
+        """Prints the average inference iterations of warm and cold started batches since the last reset, and the average iterations saved by warm start
+        """
+        stats = self.warm_start_stats
+        warm = stats['warm_iterations']/max(stats['warm_batches'], 1)
+        cold = stats['cold_iterations']/max(stats['cold_batches'], 1)
+        print(f"Warm start: {stats['warm_batches']} batches, avg iterations: {warm:.2f} | cold start: {stats['cold_batches']} batches, avg iterations: {cold:.2f}", end="")
+        if stats['warm_batches'] > 0 and stats['cold_batches'] > 0:
+            print(f" | avg iterations saved: {cold - warm:.2f}")
+        else:
+            print("")
+
     def gradients(self, x, e):
         """Calculates gradients for w and b, given the Predictive Coding equations. Assumes variance is 1.
         
@@ -397,21 +1397,38 @@ class PcTorch:
             e: neuron errors given by the inference method (batch)
 
         Returns:
-            Gradients for w and b
+            Gradients for w and b, with the compute precision. With a factorised input layer, the gradient of w[0] is the pair of factor gradients (dU, dV)
         """
 
-        w_dot = {}
-        b_dot = {}
+        batch_size = e[1].shape[1]
+        ws = self.get_workspace(batch_size)
+        w_dot = ws['dw']
+        b_dot = ws['db']
 
         for l in range(self.n_layers-1):
-            b_dot[l] = torch.sum(e[l+1], 1).view(-1, 1)/self.batch_size # make column vector
-            FXs = self.F(x[l])
-            w_dot[l] = torch.matmul(e[l+1] , FXs.transpose(0,1) )/self.batch_size
+            torch.sum(e[l+1], 1, keepdim=True, out=b_dot[l]) # make column vector
+            b_dot[l].div_(batch_size)
+            if l == 0:
+                FXs, _ = self.input_projection(x[0])
+                if self.input_rank is not None:
+                    # W = U·V: dU = e F^T V^T = e h^T (with h = V F), dV = U^T e F^T
+                    u = self.w_u.to(self.compute_dtype)
+                    torch.matmul(e[1], self.input_cache['h'].transpose(0,1), out=ws['du']).div_(batch_size)
+                    torch.matmul(u.transpose(0,1), e[1], out=ws['ue'])
+                    self.activation_outer(ws['ue'], FXs, 0, out=ws['dv']).div_(batch_size)
+                    w_dot[0] = (ws['du'], ws['dv'])
+                    continue
+            else:
+                FXs = self.cached_activation(x, l)
+                if FXs is None:
+                    FXs = self.F(x[l], out=ws['fx'][l])
+            self.activation_outer(e[l+1], FXs, l, out=w_dot[l])
+            w_dot[l].div_(batch_size)
 
         return w_dot, b_dot
 
     def update_weights(self, x, e):
-        """Calculates the gradients based on values of the neuron errors after inference, and then update the gradients according to some optimization algorithm
+        """Calculates the gradients based on values of the neuron errors after inference, and then update the gradients according to some optimization algorithm (see `snn/optimizers.py`). Weights and optimizer variables are updated in place. With the bfloat16 precision, the optimizer updates float32 master weights, rounded to bfloat16 after each update
 
         Args:
             x: neuron values (batch)
@@ -420,47 +1437,206 @@ class PcTorch:
         """
 
         dw,db = self.gradients(x,e)
-        vdb = {}
-        vdw = {}
-        sdb = {}
-        sdw = {}
 
-        for key in self.vdb:
-            vdb[key] = torch.clone(self.vdb[key])
-            vdw[key] = torch.clone(self.vdw[key])
-            sdb[key] = torch.clone(self.sdb[key])
-            sdw[key] = torch.clone(self.sdw[key])
+        layers = range(self.n_layers-1)
+        if self.input_rank is None:
+            weights = [self.w[l] for l in layers]
+            dws = [dw[l] for l in layers]
+        else:
+            weights = [self.w_u, self.w_v] + [self.w[l] for l in layers if l > 0]
+            dws = list(dw[0]) + [dw[l] for l in layers if l > 0]
+
+        biases = [self.b[l] for l in layers]
+        if self.dtype == self.compute_dtype:
+            self.pc_optimizer.step(weights, biases, dws, [db[l] for l in layers])
+        else:
+            # Updates smaller than the bfloat16 resolution would be rounded away: the optimizer updates float32 master
+            # copies of the parameters (and keeps its variables in float32), which are then rounded to the storage precision
+            params = weights + biases
+            if self.master_weights is None:
+                self.master_weights = [p.to(self.compute_dtype) for p in params]
+            masters = self.master_weights
+            self.pc_optimizer.step(masters[:len(weights)], masters[len(weights):], dws, [db[l] for l in layers])
+            for p, master in zip(params, masters):
+                p.copy_(master)
+
+        # Weights changed, the cached input projection is no longer valid. The next batch has new states
+        self.input_cache = None
+        self.clear_activation_cache()
+
+    def set_optimizer(self):
+        """Creates the optimizer selected by `self.optimizer`, with the current hyper-parameters. Resets the optimizer variables (and the float32 master weights of the bfloat16 precision, copied again from the weights on the next update)
+        """
+        self.master_weights = None
+        self.pc_optimizer = optimizers.OPTIMIZERS[self.optimizer](
+            self.alpha,
+            momentum=self.b1,
+            b2=self.b2,
+            epsilon=self.epslon,
+            weight_decay=self.weight_decay)
+
+    def weights(self, l):
+        """Returns the weights and biases of a layer converted to the compute precision. No copy is made if the storage and compute precisions are the same
 
-        for l in range(self.n_layers-1):
+        Args:
+            l: index of the layer
+
+        Returns:
+            - Weight matrix w[l]
+            - Bias vector b[l]
+        """
+        return self.w[l].to(self.compute_dtype), self.b[l].to(self.compute_dtype)
+
+    def weight_shape(self, l):
+        """Returns the shape of the weights w[l]: [neurons[l+1], neurons[l]] for dense connections, or the shape of the kernels of a spatial connection (see `snn/layers.py`)
+        """
+        if l in self.layer_ops:
+            return self.layer_ops[l].weight_shape
+        return (self.neurons[l+1], self.neurons[l])
+
+    def error_feedback(self, w, e, l, out=None):
+        """Calculates the feedback w[l]^T e[l+1] of the errors of layer l+1 to layer l (a transposed convolution for spatial connections)
+        """
+        if l in self.layer_ops:
+            if out is None:
+                return self.layer_ops[l].feedback(w, e)
+            return out.copy_(self.layer_ops[l].feedback(w, e))
+        return torch.matmul(w.transpose(1,0), e, out=out)
+
+    def use_sparse(self, fx, l):
+        """Measures the sparsity of the activations F(x[l]) and decides whether sparse products should be used (only with ReLU activation, when `self.sparse_threshold` is set)
+        """
+        if self.sparse_threshold is None or self.activation != 'relu':
+            return False
+
+        sparsity = 1.0 - torch.count_nonzero(fx).item()/fx.numel()
+        self.activation_sparsity[l] = sparsity
+        return sparsity >= self.sparse_threshold
+
+    def activation_product(self, w, fx, l):
+        """Calculates w @ fx, where fx = F(x[l]). If the activations are sparse enough (see `use_sparse()`), the zeros are skipped:
+            - 'gather': only the neurons active for some sample of the batch are used (columns of w, rows of fx)
+            - 'csr': fx is converted to a sparse CSR matrix
+
+        Args:
+            w: weight matrix
+            fx: activations (batch form)
+            l: layer of the activations
+
+        Returns:
+            The product w @ fx (dense)
+        """
+        if l in self.layer_ops:
+            return self.layer_ops[l].predict(w, fx)
+
+        if not self.use_sparse(fx, l):
+            return torch.matmul(w, fx)
+
+        if self.sparse_method == 'csr':
+            return torch.sparse.mm(fx.transpose(0,1).to_sparse_csr(), w.transpose(0,1)).transpose(0,1)
+
+        active = torch.any(fx != 0, dim=1).nonzero().squeeze(1)
+        return torch.matmul(w[:, active], fx[active])
+
+    def activation_outer(self, e, fx, l, out):
+        """Calculates the outer products of the weight gradient, out = e @ fx^T, where fx = F(x[l]), skipping the zeros of sparse activations (see `activation_product()`)
+
+        Args:
+            e: errors of layer l+1 (batch form)
+            fx: activations of layer l (batch form)
+            l: layer of the activations
+            out: output tensor
+        """
+        if l in self.layer_ops:
+            return self.layer_ops[l].gradient(e, fx, out)
+
+        if not self.use_sparse(fx, l):
+            return torch.matmul(e, fx.transpose(0,1), out=out)
+
+        if self.sparse_method == 'csr':
+            return out.copy_(torch.sparse.mm(fx.to_sparse_csr(), e.transpose(0,1)).transpose(0,1))
+
+        active = torch.any(fx != 0, dim=1).nonzero().squeeze(1)
+        out.zero_()
+        out[:, active] = torch.matmul(e, fx[active].transpose(0,1))
+        return out
+
+    def cached_activation(self, x, l):
+        """Returns the cached F(x[l]), if it was computed for the tensor x[l] (by `feedforward()` or `inference()`), otherwise None
+
+        Remarks:
+            - Entries are matched by tensor identity. Methods that change x[l] in place must refresh its entry (see `store_activation()`) or clear the cache
+        """
+        cache = self.activation_cache
+        if l in cache['x'] and cache['x'][l] is x[l]:
+            return cache['Fx'][l]
+        return None
+
+    def store_activation(self, x, l, Fx, dFx=None):
+        """Stores F(x[l]) (and optionally dF(x[l])) in the activation cache, see `cached_activation()`
+        """
+        self.activation_cache['x'][l] = x[l]
+        self.activation_cache['Fx'][l] = Fx
+        self.activation_cache['dFx'][l] = dFx
+
+    def clear_activation_cache(self):
+        """Invalidates all entries of the activation cache (new states or activation function)
+        """
+        self.activation_cache = {'x': {}, 'Fx': {}, 'dFx': {}}
+
+    def dF_from_F(self, x, fx, out):
+        """Calculates dF(x) reusing F(x): sigmoid derivative from the sigmoid output, ReLU mask from the positive activations
+        """
+        if self.activation == 'sigmoid':
+            torch.mul(fx, fx, out=out)
+            return out.neg_().add_(fx)
+        if self.activation == 'relu':
+            return torch.gt(fx, 0, out=out)
+        return self.dF(x, out=out)
+
+    def input_projection(self, x0):
+        """Returns the activation of the input layer and its prediction of the first hidden layer. Because the input layer is clamped during inference, these values are computed only once per batch (normally by `feedforward()`) and then reused 
+
+        Args:
+            x0: input layer values (batch)
+
+        Returns:
+            - F(x[0])
+            - w[0]F(x[0]) + b[0]
+        """
+        if self.input_cache is not None and self.input_cache['x'] is x0:
+            return self.input_cache['Fx'], self.input_cache['mu']
+
+        Fx = self.F(x0)
+        product, h = self.input_product(Fx)
+        mu = product + self.b[0].to(self.compute_dtype)
+        self.input_cache = {'x': x0, 'Fx': Fx, 'mu': mu, 'h': h}
 
-            # Switch optimizer
-            if self.optimizer == 'none':
-                self.b[l] += self.alpha*db[l]
-                self.w[l] += self.alpha*dw[l]
-
-            elif self.optimizer == 'adam':
-                vdb[l] = self.b1*vdb[l] + (1-self.b1)*db[l]
-                vdw[l] = self.b1*vdw[l] + (1-self.b1)*dw[l]
-                
-                sdb[l] = self.b2*sdb[l] + (1-self.b2)*(db[l].square())
-                sdw[l] = self.b2*sdw[l] + (1-self.b2)*(dw[l].square())
-                
-                x1 = self.alpha * np.sqrt(1 - self.b2**self.t) / (1 - self.b1**self.t) 
-                self.b[l] = self.b[l] + x1* torch.div( vdb[l] , (torch.sqrt(sdb[l]) + self.epslon))
-                self.w[l] = self.w[l] + x1* torch.div( vdw[l] , (torch.sqrt(sdw[l]) + self.epslon)) 
-                self.t += 1
-
-            elif self.optimizer == 'sgd':
-                vdb[l] = self.b1*vdb[l] + self.alpha*db[l]
-                vdw[l] = self.b1*vdw[l] + self.alpha*dw[l]
-
-                self.b[l] += vdb[l]
-                self.w[l] += vdw[l]
-
-        self.vdb = vdb
-        self.vdw = vdw
-        self.sdb = sdb
-        self.sdw = sdw
+        return Fx, mu
+
+    def input_product(self, Fx):
+        """Calculates w[0]F(x[0]). With a factorised input layer (`input_rank`), it is computed as U·(V·F(x[0])), without forming w[0]
+
+        Args:
+            Fx: input layer activations (batch)
+
+        Returns:
+            - w[0]F(x[0])
+            - V·F(x[0]), used by the gradient of U (None if the input layer is dense)
+        """
+        if self.input_rank is None:
+            w, _ = self.weights(0)
+            return self.activation_product(w, Fx, 0), None
+
+        h = self.activation_product(self.w_v.to(self.compute_dtype), Fx, 0)
+        return torch.matmul(self.w_u.to(self.compute_dtype), h), h
+
+    def input_weights(self):
+        """Returns the (dense) input layer weights w[0] with the compute precision, multiplying the factors if the input layer is factorised
+        """
+        if self.input_rank is None:
+            return self.weights(0)[0]
+        return torch.matmul(self.w_u.to(self.compute_dtype), self.w_v.to(self.compute_dtype))
 
     def mse(self, labels_estimated, labels_groundtruth):
         """Calculates mean squared error for network output, given the groundtruth labels with same shape
@@ -492,17 +1668,17 @@ class PcTorch:
         flattened = input.reshape([-1, 1])
 
         # Convert to torch tensor
-        tensor = torch.from_numpy(flattened.astype(PcTorch.dtype))
+        tensor = torch.from_numpy(flattened).to(PcTorch.device, dtype=self.compute_dtype)
 
         # Feedforward
         x = self.feedforward(tensor)
 
         # Convert last layer to np.array
-        output = x[self.n_layers-1].numpy()
+        output = x[self.n_layers-1].cpu().numpy()
 
         return output
 
-    def set_training_parameters(self, batch_size, max_it=10, activation='relu', optimizer='none', learning_rate=0.001, momentum=0.9, normalize_input=False):
+    def set_training_parameters(self, batch_size, max_it=10, activation='relu', optimizer='none', learning_rate=0.001, momentum=0.9, normalize_input=False, weight_decay=0.01, fixed_prediction=False, incremental_update_interval=0, stacked_inference=False, update_order='jacobi', sparse_threshold=None, sparse_method='gather', solver='gd', residual_tolerance=0, per_sample_convergence=False, sync_free_inference=False, convergence_check_interval=0, inference_backend='eager'):
 
         """ Sets the training parameters once. Used in conjunction with `single_batch_pass()`, so that parameters don't need to be set every batch call. `train()` does not require this function call, because it already receives the parameter list. 
         
@@ -512,7 +1688,21 @@ class PcTorch:
             activation: activation function
             optimizer: optimizer of training algorithm
             learning_rate: the learning rate for PC
+            momentum: momentum of the optimizer (first moment decay rate for adam)
+            weight_decay: decoupled weight decay of the adamw optimizer
             normalize_input: Normalize input to range [0..1] according to some function. The function depends on the distribution of the input data and is hard coded on the function `normalize_input_function()`. 
+            fixed_prediction: Hold the predictions at their feedforward values, computing the inference errors in `n_layers-1` steps instead of up to `max_it` iterations, see `inference_fixed_prediction()`
+            incremental_update_interval: If greater than 0, update the weights every `incremental_update_interval` inference iterations (incremental predictive coding), see `relax()`
+            stacked_inference: For hidden layers of equal size, update all hidden layers with batched matrix multiplications, see `descent_directions()`
+            update_order: Order of the hidden layer updates of the inference: 'jacobi', 'gauss_seidel_up', 'gauss_seidel_down' or 'red_black', see `relaxation_phases()`
+            sparse_threshold: With ReLU activation, minimum sparsity (fraction of zeros) of the activations to skip their zeros in the matrix products (None: always dense), see `activation_product()`
+            sparse_method: Sparse product used above `sparse_threshold`: 'gather' or 'csr'
+            solver: Relaxation solver of the inference: 'gd', 'momentum', 'nesterov', 'anderson', 'adaptive' or 'per_sample', see `snn/solvers.py`
+            residual_tolerance: Stop inference when the mean residual norm is below this value (0: disabled)
+            per_sample_convergence: Stop inference separately for each sample of the batch, see `compact_relaxation_state()`
+            sync_free_inference: Evaluate the inference stopping criteria on the device, see `relax()`
+            convergence_check_interval: With `sync_free_inference`, number of iterations between checks for early stopping (0: always run `max_it` iterations)
+            inference_backend: Compilation of the inference iterations: 'eager', 'torchscript' or 'compile' (torch.compile). Compiled backends evaluate the stopping criteria on the device. See `relaxation_settings()` for the settings that cannot be combined
         """
 
         # batch_size
@@ -520,17 +1710,19 @@ class PcTorch:
         assert self.batch_size > 0
 
         # max_it
-        self.max_it = max_it
-        assert self.max_it >= 1
+        self.set_max_it(max_it)
 
         # activation
         if activation not in PcTorch.ActivationFunctions:
             print(f"Warning: Activation '{activation}' not found, using default.")
             activation = PcTorch.ActivationFunctions[0] 
 
+        self.activation = activation
         self.F = PcTorch.ActivationFunctions[activation]
         self.dF = PcTorch.ActivationDerivatives[activation]
+        self.FdF = PcTorch.ActivationPairs[activation]
         self.preprocessing = PcTorch.PreprocessingFunctions[activation]
+        self.clear_activation_cache()
 
         # optimizer
         if optimizer  not in PcTorch.Optimizers:
@@ -545,10 +1737,101 @@ class PcTorch:
         # momentum
         self.b1 = momentum
 
+        # weight_decay
+        self.weight_decay = weight_decay
+
+        self.set_optimizer()
+
         # normalize_input
         self.normalize_input = normalize_input
 
-    def single_batch_pass(self, train_data, train_labels, transpose=True):
+        # fixed_prediction
+        self.fixed_prediction = fixed_prediction
+
+        # incremental_update_interval
+        self.incremental_update_interval = incremental_update_interval
+        assert self.incremental_update_interval >= 0
+
+        # sparse_threshold
+        if sparse_method not in PcTorch.SparseMethods:
+            print(f"Warning: Sparse method '{sparse_method}' not found, using default.")
+            sparse_method = PcTorch.SparseMethods[0]
+
+        self.sparse_threshold = sparse_threshold
+        self.sparse_method = sparse_method
+
+        # update_order
+        if update_order not in PcTorch.UpdateOrders:
+            print(f"Warning: Update order '{update_order}' not found, using default.")
+            update_order = PcTorch.UpdateOrders[0]
+
+        self.update_order = update_order
+
+        # stacked_inference
+        self.stacked_inference = stacked_inference
+        if self.stacked_inference and self.w_stack is None:
+            print("Warning: Stacked inference requires at least 2 hidden layers of equal size, using default.")
+
+        # solver
+        if solver not in solvers.SOLVERS:
+            print(f"Warning: Solver '{solver}' not found, using default.")
+            solver = 'gd'
+
+        self.solver = solver
+        self.relaxation_solver = solvers.SOLVERS[solver](self.beta)
+        self.residual_tolerance = residual_tolerance
+
+        # per_sample_convergence
+        self.per_sample_convergence = per_sample_convergence
+
+        # sync_free_inference
+        self.sync_free_inference = sync_free_inference
+        self.convergence_check_interval = convergence_check_interval
+        assert self.convergence_check_interval >= 0
+
+        # inference_backend
+        if inference_backend not in kernels.InferenceBackends:
+            print(f"Warning: Inference backend '{inference_backend}' not found, using default.")
+            inference_backend = kernels.InferenceBackends[0]
+
+        self.inference_backend = inference_backend
+        self.relaxation_kernel = kernels.get_relaxation_kernel(self.inference_backend)
+
+        self.check_inference_settings()
+
+    def check_inference_settings(self):
+        """Warns about the inference settings that are ignored, because a non-iterative inference method takes precedence (see `inference_method()`) or because they cannot be combined with the other settings (see `relaxation_settings()`)
+        """
+        method = self.inference_method()
+        if method == 'relaxation':
+            ignored = self.relaxation_settings()[1]
+            if self.fixed_prediction:
+                ignored.insert(0, ('fixed_prediction', "networks with spatial layers only support the relaxation inference"))
+        else:
+            if method == 'linear_equilibrium':
+                reason = "the linear closed-form inference takes precedence (set `closed_form_linear = False` to disable it)"
+            else:
+                reason = "the fixed prediction inference takes precedence"
+            settings = [
+                ('incremental_update_interval', self.incremental_update_interval > 0),
+                ('stacked_inference', self.stacked_inference and self.w_stack is not None),
+                ('update_order', self.update_order != 'jacobi'),
+                ('solver', self.solver != 'gd'),
+                ('residual_tolerance', self.residual_tolerance > 0),
+                ('per_sample_convergence', self.per_sample_convergence),
+                ('sync_free_inference', self.sync_free_inference),
+                ('inference_backend', self.inference_backend != 'eager')
+            ]
+            ignored = [(name, reason) for name, enabled in settings if enabled]
+
+        # One warning per reason
+        reasons = {}
+        for name, reason in ignored:
+            reasons.setdefault(reason, []).append(name)
+        for reason, names in reasons.items():
+            print(f"Warning: {', '.join(names)} ignored, {reason}.")
+
+    def single_batch_pass(self, train_data, train_labels, transpose=True, indices=None):
         """ Performs a single training pass on the Predictive Coding Network, which consists of: Feedforward, Inference and Weight Update steps. 
 
         Accept an input in batch format. Applied pre activation function to input. 
@@ -557,6 +1840,7 @@ class PcTorch:
             train_data: a torch array with shape [batch_size, input_size] (if transpose=True)
             train_labels: a torch array with shape [batch_size, num_classes] (if transpose=True), that is, a one-hot encoded batch array
             transpose: Indicates whether to transpose the input  
+            indices: dataset index of each sample of the batch. Required to warm start inference with the state cache (see `set_state_cache()`)
 
         Returns: 
             - Output of last layer
@@ -566,9 +1850,9 @@ class PcTorch:
         if self.normalize_input:
             train_data = PcTorch.normalize_input_function(train_data)
 
-        train_data = self.preprocessing(torch.transpose(train_data.to(dtype=PcTorch.dtype), 0, 1)) # Normalize to (0...1) ?
+        train_data = self.preprocessing(torch.transpose(train_data.to(dtype=self.compute_dtype), 0, 1)) # Normalize to (0...1) ?
 
-        train_labels = torch.transpose(train_labels.to(dtype=PcTorch.dtype), 0, 1)
+        train_labels = torch.transpose(train_labels.to(dtype=self.compute_dtype), 0, 1)
         
         # Feedforward
         x = self.feedforward(train_data)
@@ -576,7 +1860,7 @@ class PcTorch:
 
         # Perform inference
         x[out_layer] = train_labels
-        x,e = self.inference(x)
+        x,e = self.warm_start_inference(x, indices)
 
         # Update weightsx
         self.update_weights(x,e)
@@ -589,12 +1873,132 @@ class PcTorch:
         if self.normalize_input:
             train_data = PcTorch.normalize_input_function(train_data)
 
-        train_data = self.preprocessing(torch.transpose(train_data.to(dtype=PcTorch.dtype), 0, 1)) 
+        train_data = self.preprocessing(torch.transpose(train_data.to(dtype=self.compute_dtype), 0, 1)) 
 
         # Feedforward
         x = self.feedforward(train_data)
         return torch.clone(x[out_layer])
 
+    def quantize(self, calibration_data=None):
+        """Int8 post-training quantisation of the network for prediction, see `snn/QuantizedPcTorch.py`
+
+        Args:
+            calibration_data: (optional) torch array with shape [samples, input_size] used to calibrate the activation scales. Without it, the activations are quantised dynamically
+
+        Returns:
+            A QuantizedPcTorch model, with a `batch_inference()` method
+        """
+        return QuantizedPcTorch(self, calibration_data)
+
+    def predictor(self, preprocess=True):
+        """Creates a low-latency single-sample predictor from the current weights, see `snn/Predictor.py`
+
+        Args:
+            preprocess: apply the input normalization and preprocessing to the samples, as `batch_inference()`
+
+        Returns:
+            A Predictor, with `predict()`, `predict_numpy()` and `classify()` methods
+        """
+        return Predictor(self, preprocess)
+
+    def neuron_importance(self, l, data=None):
+        """Scores the neurons of a hidden layer for pruning: norm of the outgoing weights (column of w[l]), multiplied by the mean activity |F(x[l])| over `data` if given
+
+        Args:
+            l: hidden layer
+            data: (optional) torch array with shape [batch_size, input_size], as in `batch_inference()`
+
+        Returns:
+            - Score of each neuron of the layer
+            - Mean activation F(x[l]) of each neuron (None if `data` is not given)
+        """
+        assert 0 < l < self.n_layers-1
+        w, _ = self.weights(l)
+        score = torch.linalg.norm(w, dim=0)
+
+        if data is None:
+            return score, None
+
+        if self.normalize_input:
+            data = PcTorch.normalize_input_function(data)
+        x = self.feedforward(self.preprocessing(torch.transpose(data.to(dtype=self.compute_dtype), 0, 1)))
+        Fx = self.F(x[l])
+        activity = torch.mean(torch.abs(Fx), 1)
+
+        return score*activity, torch.mean(Fx, 1, keepdim=True)
+
+    def prune(self, keep_ratio=0.5, threshold=None, data=None, min_neurons=1):
+        """Structured pruning: removes the least important neurons of each hidden layer (see `neuron_importance()`), that is, rows of w[l-1] and b[l-1] and columns of w[l], and returns a smaller dense model. The network can then be fine-tuned with `train()` or `single_batch_pass()`
+
+        Remarks:
+            - If `data` is given, the mean contribution of the removed neurons to the next layer is folded into its bias b[l]
+            - Training parameters are copied from this model. The optimizer variables, state cache and iteration budget controller are not (their shapes change)
+            - A factorised input layer keeps its rank, unless fewer neurons than the rank are kept in the first hidden layer: its factors are then re-factorised with the rank reduced to the number of neurons
+
+        Args:
+            keep_ratio: fraction of the neurons of each hidden layer to keep (ignored if `threshold` is given)
+            threshold: (optional) keep the neurons with score >= threshold*(maximum score of the layer)
+            data: (optional) torch array with shape [batch_size, input_size] used to measure the activity of the neurons
+            min_neurons: minimum number of neurons kept in each hidden layer
+
+        Returns:
+            The pruned PcTorch model
+        """
+        assert not self.layer_ops, "Pruning of spatial connections is not supported"
+        keep = {0: torch.arange(self.neurons[0], device=PcTorch.device), self.n_layers-1: torch.arange(self.neurons[-1], device=PcTorch.device)}
+        mean_activation = {}
+        for l in range(1,self.n_layers-1):
+            score, mean_activation[l] = self.neuron_importance(l, data)
+            if threshold is not None:
+                count = int(torch.sum(score >= threshold*torch.max(score)).item())
+            else:
+                count = int(round(keep_ratio*self.neurons[l]))
+            count = min(max(count, min_neurons), self.neurons[l])
+            keep[l] = torch.sort(torch.topk(score, count).indices).values
+
+        neurons = [len(keep[l]) for l in range(self.n_layers)]
+        input_rank = None if self.input_rank is None else min(self.input_rank, neurons[1])
+        pruned = PcTorch(neurons, precision=self.precision, input_rank=input_rank)
+
+        excluded = ['neurons', 'n_layers', 'w', 'b', 'w_stack', 'b_stack', 'w_u', 'w_v', 'pc_optimizer', 'relaxation_solver', 'state_cache', 'max_it_controller',
+            'input_rank', 'workspaces', 'workspace_allocations', 'input_cache', 'activation_cache', 'activation_sparsity', 'inference_iterations', 'iterations_histogram']
+        for name, value in vars(self).items():
+            if name not in excluded:
+                setattr(pruned, name, value)
+
+        if self.pc_optimizer is not None:
+            pruned.set_optimizer()
+        if self.relaxation_solver is not None:
+            pruned.relaxation_solver = solvers.SOLVERS[self.solver](self.beta)
+        pruned.reset_warm_start_stats()
+
+        # Weights are copied in place, so stacked weights stay views of `w_stack`
+        if self.input_rank is not None:
+            u = self.w_u[keep[1]].to(self.compute_dtype)
+            v = self.w_v.to(self.compute_dtype)
+            if input_rank < self.input_rank:
+                # Fewer neurons than the rank: U·V is re-factorised exactly with the SVD of U = A·S·B^T,
+                # U' = A·sqrt(S), V' = sqrt(S)·B^T·V
+                a, singular, bt = torch.linalg.svd(u, full_matrices=False)
+                root = torch.sqrt(singular)
+                u = a*root
+                v = root.unsqueeze(1)*torch.matmul(bt, v)
+            pruned.w_u.copy_(u)
+            pruned.w_v.copy_(v)
+            pruned.b[0].copy_(self.b[0][keep[1]])
+
+        for l in range(0 if self.input_rank is None else 1, self.n_layers-1):
+            w, b = self.weights(l)
+            b = b[keep[l+1]]
+            if l in mean_activation and mean_activation[l] is not None:
+                removed = torch.ones(self.neurons[l], dtype=torch.bool, device=PcTorch.device)
+                removed[keep[l]] = False
+                b = b + torch.matmul(w[:, removed], mean_activation[l][removed])[keep[l+1]]
+            pruned.w[l].copy_(w[keep[l+1]][:, keep[l]])
+            pruned.b[l].copy_(b)
+
+        return pruned
+
     @staticmethod
     def normalize_input_function(x): 
         """
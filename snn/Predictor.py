@@ -0,0 +1,99 @@
+import torch
+import numpy as np
+
+class Predictor:
+    """Low-latency single-sample prediction with a trained PcTorch network (the feedforward pass of `PcTorch.test_sample()`)
+
+    The weights are copied once with the compute precision, and the input, hidden and output buffers are preallocated, so a prediction performs no tensor allocations and returns only the output layer
+
+    Remarks:
+        - The returned output is a buffer, overwritten by the next prediction
+        - The predictor is a copy: later training of the PcTorch network does not change it (create a new predictor)
+        - Spatial connections (`snn/layers.py`) are not supported
+    """
+
+    def __init__(self, pc_model, preprocess=True):
+        """
+        Args:
+            pc_model: trained PcTorch network (with the training parameters set, for the activation and preprocessing functions)
+            preprocess: apply the input normalization and preprocessing to the samples, as `PcTorch.batch_inference()`. Use False for samples already preprocessed, as with `PcTorch.test_sample()`
+        """
+        assert not pc_model.layer_ops, "Spatial connections are not supported by the predictor"
+
+        self.n_layers = pc_model.n_layers
+        self.neurons = list(pc_model.neurons)
+        self.activation = pc_model.activation
+        self.F = pc_model.F
+        self.normalize_input = pc_model.normalize_input
+        self.preprocess_input = preprocess
+        self.device = pc_model.device
+        self.dtype = pc_model.compute_dtype
+
+        def copy(tensor):
+            return tensor.to(self.device, dtype=self.dtype).clone().contiguous()
+
+        # Weights (the factorised input layer keeps its factors)
+        self.w = {}
+        self.b = {}
+        for l in range(self.n_layers-1):
+            self.b[l] = copy(pc_model.b[l])
+            if l > 0 or pc_model.input_rank is None:
+                self.w[l] = copy(pc_model.w[l])
+
+        self.w_u = None if pc_model.input_rank is None else copy(pc_model.w_u)
+        self.w_v = None if pc_model.input_rank is None else copy(pc_model.w_v)
+
+        # Buffers: x[l] states, fx[l] activations
+        self.x = {l: torch.empty(self.neurons[l], 1, dtype=self.dtype, device=self.device) for l in range(self.n_layers)}
+        self.fx = {l: torch.empty(self.neurons[l], 1, dtype=self.dtype, device=self.device) for l in range(self.n_layers-1)}
+        if self.w_v is not None:
+            self.h = torch.empty(self.w_v.shape[0], 1, dtype=self.dtype, device=self.device)
+
+        self.output = self.x[self.n_layers-1].view(-1)
+        self.output_numpy = self.output.numpy() if self.device.type == 'cpu' else None
+
+    def preprocess(self):
+        """Applies the input normalization and the preprocessing of the activation function (see `PcTorch.PreprocessingFunctions`) in place
+        """
+        x = self.x[0]
+        if self.normalize_input:
+            x.pow_(1.5).div_(4.0).clamp_(0.0, 1.0) # PcTorch.normalize_input_function()
+        if self.activation == 'sigmoid':
+            torch.logit(x, out=x) # log(x/(1 - x))
+
+    @torch.no_grad()
+    def predict(self, sample):
+        """Performs a forward pass on a single sample
+
+        Args:
+            sample: a np.array or torch array with a single data sample (any shape with `neurons[0]` elements)
+
+        Returns:
+            A torch array with the output layer, shape [num_classes] (a buffer, overwritten by the next prediction)
+        """
+        if isinstance(sample, np.ndarray):
+            sample = torch.from_numpy(sample)
+        self.x[0].view(-1).copy_(sample.reshape(-1))
+        if self.preprocess_input:
+            self.preprocess()
+
+        for l in range(self.n_layers-1):
+            Fx = self.F(self.x[l], out=self.fx[l])
+            if l == 0 and self.w_u is not None:
+                torch.matmul(self.w_v, Fx, out=self.h)
+                torch.addmm(self.b[0], self.w_u, self.h, out=self.x[1])
+            else:
+                torch.addmm(self.b[l], self.w[l], Fx, out=self.x[l+1])
+
+        return self.output
+
+    def predict_numpy(self, sample):
+        """Same as `predict()`, returning a np.array (sharing the output buffer on CPU)
+        """
+        output = self.predict(sample)
+        return self.output_numpy if self.output_numpy is not None else output.cpu().numpy()
+
+    def classify(self, sample):
+        """Returns the index of the most active output neuron for a single sample
+        """
+        return int(torch.argmax(self.predict(sample)).item())
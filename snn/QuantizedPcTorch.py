@@ -0,0 +1,125 @@
+import torch
+
+class QuantizedPcTorch:
+    """Int8 post-training quantisation of a trained PcTorch network, for prediction (the feedforward pass of `PcTorch.batch_inference()`) on CPU
+
+    Weights are quantised to int8 with one scale per row (output neuron), and the products use the quantised linear kernels of pytorch (fbgemm/qnnpack). Activations are quantised to uint8:
+        - static: with scales calibrated over a sample of features (`calibration_data`)
+        - dynamic: with scales computed for each batch (no `calibration_data`)
+
+    Remarks:
+        - A factorised input layer is quantised as its dense product, and spatial connections (`snn/layers.py`) are not supported
+        - The model is a copy: later training of the PcTorch network does not change it
+    """
+
+    def __init__(self, pc_model, calibration_data=None):
+        """
+        Args:
+            pc_model: trained PcTorch network (with the training parameters set, for the activation function)
+            calibration_data: (optional) torch array with shape [samples, input_size], as in `batch_inference()`. A few hundred samples are usually enough
+        """
+        assert not pc_model.layer_ops, "Quantisation of spatial connections is not supported"
+
+        engines = torch.backends.quantized.supported_engines
+        self.quantized_kernels = any(engine in engines for engine in ['fbgemm', 'x86', 'qnnpack'])
+        if not self.quantized_kernels:
+            print("Warning: Quantised kernels not available, using dequantised weights.")
+
+        # The fbgemm/x86 kernels accumulate uint8 x int8 products in int16 pairs, which can saturate:
+        # the quantised inputs of their products use a reduced (7 bit) range
+        self.reduce_range = torch.backends.quantized.engine in ['fbgemm', 'x86']
+        self.quant_max = 127 if self.reduce_range else 255
+
+        self.n_layers = pc_model.n_layers
+        self.neurons = list(pc_model.neurons)
+        self.activation = pc_model.activation
+        self.F = pc_model.F
+        self.preprocessing = pc_model.preprocessing
+        self.normalize_input = pc_model.normalize_input
+        self.normalize_input_function = pc_model.normalize_input_function
+
+        # Int8 weights with per-row scales
+        self.w = {}
+        self.w_scale = {}
+        self.b = {}
+        self.packed = {}
+        for l in range(self.n_layers-1):
+            w = pc_model.input_weights() if l == 0 else pc_model.weights(l)[0]
+            w = w.to('cpu', dtype=torch.float32)
+            self.w_scale[l] = torch.clamp(torch.max(torch.abs(w), 1).values/127, min=1e-12)
+            self.w[l] = torch.clamp(torch.round(w/self.w_scale[l].unsqueeze(1)), -127, 127).to(torch.int8)
+            self.b[l] = pc_model.b[l].to('cpu', dtype=torch.float32).flatten()
+
+            if self.quantized_kernels:
+                qw = torch.quantize_per_channel(w, self.w_scale[l].double(), torch.zeros_like(self.w_scale[l], dtype=torch.long), 0, torch.qint8)
+                self.packed[l] = torch.ops.quantized.linear_prepack(qw, self.b[l])
+
+        # Activation ranges: F(x[l]) (input of layer l) and x[l+1] (output of layer l)
+        self.calibrated = calibration_data is not None
+        self.in_qparams = {}
+        self.out_qparams = {}
+        if self.calibrated:
+            self.calibrate(pc_model, calibration_data)
+
+    @staticmethod
+    def qparams(minimum, maximum, quant_max=255):
+        """Returns the scale and zero point of the uint8 quantisation of the range [minimum, maximum] (extended to contain 0) to the integers [0, quant_max]
+        """
+        minimum = min(minimum, 0.0)
+        maximum = max(maximum, 0.0)
+        scale = max((maximum - minimum)/quant_max, 1e-12)
+        zero_point = int(min(max(round(-minimum/scale), 0), quant_max))
+        return scale, zero_point
+
+    def calibrate(self, pc_model, calibration_data):
+        """Records the ranges of the activations of the float network over `calibration_data`
+        """
+        x = pc_model.feedforward(self.preprocess(calibration_data).to(pc_model.device, dtype=pc_model.compute_dtype).t())
+        for l in range(self.n_layers-1):
+            Fx = self.F(x[l])
+            self.in_qparams[l] = QuantizedPcTorch.qparams(torch.min(Fx).item(), torch.max(Fx).item(), self.quant_max)
+            self.out_qparams[l] = QuantizedPcTorch.qparams(torch.min(x[l+1]).item(), torch.max(x[l+1]).item())
+
+    def preprocess(self, data):
+        if self.normalize_input:
+            data = self.normalize_input_function(data)
+        return self.preprocessing(data.to('cpu', dtype=torch.float32))
+
+    def linear(self, l, Fx):
+        """Calculates w[l]F(x[l]) + b[l] with the quantised weights, in row form ([batch_size, neurons])
+        """
+        if not self.quantized_kernels:
+            w = self.w[l].to(torch.float32)*self.w_scale[l].unsqueeze(1)
+            return torch.nn.functional.linear(Fx, w, self.b[l])
+
+        if not self.calibrated:
+            return torch.ops.quantized.linear_dynamic(Fx, self.packed[l], self.reduce_range)
+
+        scale, zero_point = self.in_qparams[l]
+        qx = torch.quantize_per_tensor(Fx, scale, zero_point, torch.quint8)
+        scale, zero_point = self.out_qparams[l]
+        return torch.ops.quantized.linear(qx, self.packed[l], scale, zero_point).dequantize()
+
+    def batch_inference(self, data, transpose=True):
+        """Feedforward pass with the quantised network, same arguments and result as `PcTorch.batch_inference()`
+
+        Args:
+            data: a torch array with shape [batch_size, input_size] (if transpose=True)
+            transpose: Indicates whether the input has the samples in its rows
+
+        Returns:
+            Output of the last layer, with shape [num_classes, batch_size]
+        """
+        if not transpose:
+            data = data.t()
+
+        x = self.preprocess(data).contiguous()
+        for l in range(self.n_layers-1):
+            x = self.linear(l, self.F(x))
+
+        return x.t()
+
+    def size(self):
+        """Returns the size (bytes) of the quantised weights, scales and biases
+        """
+        return sum(self.w[l].numel() + 4*self.w_scale[l].numel() + 4*self.b[l].numel() for l in range(self.n_layers-1))
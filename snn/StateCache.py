@@ -0,0 +1,103 @@
+import collections
+import numpy as np
+import torch
+
+class StateCache:
+    """Stores the converged hidden layer states of each training sample (keyed by dataset index), so inference of the same sample can be initialized from them in the next epoch (warm start). States are stored compactly (float16 by default), in memory or in a memory-mapped file, and the least recently used samples are evicted when the cache is full
+    """
+
+    Precisions = {'float16': (torch.float16, np.float16), 'float32': (torch.float32, np.float32)}
+
+    def __init__(self, neurons, max_samples, precision='float16', filename=None):
+        """
+        Args:
+            neurons: list of integers, the size of each layer of the network (only the hidden layers are stored)
+            max_samples: maximum number of samples stored
+            precision: 'float16' or 'float32'
+            filename: if given, the states are stored in a memory-mapped file with this name instead of in memory
+        """
+        assert max_samples > 0
+        if precision not in StateCache.Precisions:
+            print(f"Warning: Precision '{precision}' not found, using default.")
+            precision = 'float16'
+
+        torch_dtype, np_dtype = StateCache.Precisions[precision]
+        self.max_samples = max_samples
+
+        # Hidden layers are stored side by side in a single [max_samples, total_hidden_neurons] array
+        self.offsets = {}
+        total = 0
+        for l in range(1, len(neurons)-1):
+            self.offsets[l] = (total, total+neurons[l])
+            total += neurons[l]
+
+        if filename is None:
+            self.states = torch.zeros(max_samples, total, dtype=torch_dtype)
+        else:
+            self.memmap = np.memmap(filename, dtype=np_dtype, mode='w+', shape=(max_samples, total))
+            self.states = torch.from_numpy(self.memmap)
+
+        self.slots = collections.OrderedDict() # dataset index -> row of self.states, in least recently used order
+        self.free_slots = list(range(max_samples-1, -1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, indices, x):
+        """Replaces the hidden states of the samples found in the cache by their stored values
+
+        Args:
+            indices: list with the dataset index of each sample (column) of the batch (python, numpy or 0-dim torch integers)
+            x: neuron activations for each layer (batch form). Hidden layers are replaced by new tensors, the original tensors are not modified
+
+        Returns:
+            Number of samples of the batch found in the cache
+        """
+        columns = []
+        rows = []
+        for column, index in enumerate(indices):
+            index = int(index)
+            if index in self.slots:
+                self.slots.move_to_end(index)
+                columns.append(column)
+                rows.append(self.slots[index])
+
+        if len(columns) == 0:
+            return 0
+
+        rows = torch.tensor(rows)
+        stored = self.states[rows]
+        columns = torch.tensor(columns, device=x[0].device)
+        for l, (start, end) in self.offsets.items():
+            x[l] = torch.clone(x[l])
+            x[l][:, columns] = stored[:, start:end].t().to(x[l].device, dtype=x[l].dtype)
+
+        return len(rows)
+
+    def put(self, indices, x):
+        """Stores the hidden states of the samples of a batch, evicting the least recently used samples if the cache is full
+
+        Args:
+            indices: list with the dataset index of each sample (column) of the batch (python, numpy or 0-dim torch integers)
+            x: neuron activations for each layer (batch form)
+
+        Remarks:
+            - If the batch has more than `max_samples` samples, only the last `max_samples` are stored (the others would be evicted by the same batch)
+        """
+        indices = [int(index) for index in indices]
+        skip = max(len(indices) - self.max_samples, 0)
+
+        rows = []
+        for index in indices[skip:]:
+            if index in self.slots:
+                self.slots.move_to_end(index)
+            else:
+                if len(self.free_slots) == 0:
+                    _, slot = self.slots.popitem(last=False)
+                    self.free_slots.append(slot)
+                self.slots[index] = self.free_slots.pop()
+            rows.append(self.slots[index])
+
+        rows = torch.tensor(rows)
+        for l, (start, end) in self.offsets.items():
+            self.states[rows, start:end] = x[l][:, skip:].t().to('cpu', dtype=self.states.dtype)
@@ -0,0 +1,91 @@
+import torch
+from typing import List, Tuple
+
+# Relaxation kernels of the predictive coding inference, written as plain functions of tensors
+# so they can be compiled with TorchScript or torch.compile (see `get_relaxation_kernel()`)
+
+InferenceBackends = ['eager', 'torchscript', 'compile']
+
+def activation_and_derivative(x: torch.Tensor, activation: str) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Computes the activation function F(x) and its derivative dF(x) together, sharing the intermediate values
+
+    Args:
+        x: neuron values
+        activation: name of the activation function ('relu', 'sigmoid' or 'linear')
+
+    Returns:
+        - F(x)
+        - dF(x)
+    """
+    if activation == 'sigmoid':
+        fx = torch.sigmoid(x)
+        return fx, fx*(1 - fx)
+
+    if activation == 'relu':
+        mask = torch.gt(x, 0).to(x.dtype)
+        return x*mask, mask
+
+    return x, torch.ones_like(x)
+
+def relaxation_step(
+    x: List[torch.Tensor],
+    e: List[torch.Tensor],
+    fx: List[torch.Tensor],
+    dfx: List[torch.Tensor],
+    mu1: torch.Tensor,
+    w: List[torch.Tensor],
+    b: List[torch.Tensor],
+    update_rate: torch.Tensor,
+    activation: str
+) -> Tuple[List[torch.Tensor], List[torch.Tensor], List[torch.Tensor], List[torch.Tensor], torch.Tensor]:
+    """A single predictive coding inference iteration (gradient descent, Jacobi order), without branching on tensor values. F(x) and dF(x) of the hidden layers are computed together once per state update and carried to the next iteration. The stopping criteria are evaluated by `PcTorch.relax()`
+
+    Args:
+        x: neuron activations, indexed by layer (index 0 unused)
+        e: error neurons, indexed by layer (index 0 unused)
+        fx: F(x) of the hidden layers, indexed by layer (other indices unused)
+        dfx: dF(x) of the hidden layers, indexed by layer (other indices unused)
+        mu1: prediction of the first hidden layer by the (clamped) input layer
+        w: weights, indexed by layer (index 0 unused)
+        b: biases, indexed by layer (index 0 unused)
+        update_rate: inference rate, a 0-dim tensor (0 freezes the states)
+        activation: name of the activation function
+
+    Returns:
+        Updated x, e, fx, dfx and the per-sample error (sum of squares)
+    """
+    n_layers = len(x)
+
+    # Update X
+    for l in range(1, n_layers-1):
+        g = torch.matmul(w[l].t(), e[l+1]) * dfx[l]
+        x[l] = x[l] + update_rate*(g - e[l])
+
+    for l in range(1, n_layers-1):
+        fx[l], dfx[l] = activation_and_derivative(x[l], activation)
+
+    # Update E
+    e[1] = x[1] - mu1
+    current_error = torch.sum(e[1]*e[1], 0)
+    for l in range(2, n_layers):
+        e[l] = x[l] - torch.matmul(w[l-1], fx[l-1]) - b[l-1]
+        current_error = current_error + torch.sum(e[l]*e[l], 0)
+
+    return x, e, fx, dfx, current_error
+
+def get_relaxation_kernel(backend):
+    """Returns `relaxation_step()` compiled with the selected backend
+
+    Args:
+        backend: 'eager' (not compiled), 'torchscript' or 'compile' (torch.compile, requires pytorch 2.0)
+    """
+    if backend == 'torchscript':
+        return torch.jit.script(relaxation_step)
+
+    if backend == 'compile':
+        if not hasattr(torch, 'compile'):
+            print("Warning: torch.compile not available, using eager backend.")
+            return relaxation_step
+        return torch.compile(relaxation_step)
+
+    return relaxation_step
@@ -0,0 +1,119 @@
+import torch
+import torch.nn.functional as F
+
+# Spatial connections between PcTorch layers (see the `layers` argument of `PcTorch()`)
+# Layer states keep the dense batch form [neurons, batch_size]: the neurons of a spatial layer are its feature maps
+# flattened in (channels, height, width) order, the same order as `torch.flatten()` of the extractor output.
+# A connection l (from layer l to layer l+1) provides:
+#   - predict(w, fx): prediction of layer l+1 from F(x[l]), the dense equivalent of w @ fx
+#   - feedback(w, e): error feedback to layer l from e[l+1], the dense equivalent of w^T @ e
+#   - gradient(e, fx, out): weight gradient, the dense equivalent of e @ fx^T
+# Biases are untied: one bias per neuron of layer l+1, as for dense layers
+
+def to_maps(v, shape):
+    """Converts a batch of flattened feature maps [C*H*W, batch_size] into [batch_size, C, H, W]
+    """
+    return v.transpose(0,1).reshape(-1, *shape)
+
+def to_columns(maps):
+    """Converts a batch of feature maps [batch_size, C, H, W] (or [batch_size, C, H*W]) into the batch form [C*H*W, batch_size]
+    """
+    return maps.reshape(maps.shape[0], -1).transpose(0,1)
+
+def output_size(size, kernel_size, stride, padding):
+    return (size + 2*padding - kernel_size)//stride + 1
+
+class Conv2d:
+    """Convolution, computed with unfold (im2col) and a matrix product. The error feedback is the transposed convolution, computed with fold (col2im)
+
+    Args:
+        in_shape: (channels, height, width) of the lower layer
+        out_channels: number of output channels (kernels)
+        kernel_size: size of the (square) kernels
+        stride: stride of the convolution
+        padding: zero padding of the lower layer maps
+    """
+    def __init__(self, in_shape, out_channels, kernel_size, stride=1, padding=0):
+        self.in_shape = tuple(in_shape)
+        self.kernel_size = kernel_size
+        self.stride = stride
+        self.padding = padding
+
+        channels, height, width = self.in_shape
+        self.out_shape = (out_channels, output_size(height, kernel_size, stride, padding), output_size(width, kernel_size, stride, padding))
+        self.in_neurons = channels*height*width
+        self.out_neurons = out_channels*self.out_shape[1]*self.out_shape[2]
+
+        # Weights: one row per kernel, [out_channels, channels*kernel_size*kernel_size]
+        self.weight_shape = (out_channels, channels*kernel_size*kernel_size)
+
+    def unfold(self, fx):
+        return F.unfold(to_maps(fx, self.in_shape), self.kernel_size, padding=self.padding, stride=self.stride)
+
+    def predict(self, w, fx):
+        return to_columns(torch.matmul(w, self.unfold(fx)))
+
+    def feedback(self, w, e):
+        columns = torch.matmul(w.transpose(0,1), e.transpose(0,1).reshape(e.shape[1], self.out_shape[0], -1))
+        maps = F.fold(columns, self.in_shape[1:], self.kernel_size, padding=self.padding, stride=self.stride)
+        return to_columns(maps)
+
+    def gradient(self, e, fx, out):
+        # Sum over the samples and the kernel positions: [out_channels, batch*positions] @ [batch*positions, channels*k*k]
+        batch_size = e.shape[1]
+        columns = self.unfold(fx).permute(1,0,2).reshape(self.weight_shape[1], -1)
+        errors = e.transpose(0,1).reshape(batch_size, self.out_shape[0], -1).permute(1,0,2).reshape(self.out_shape[0], -1)
+        return torch.matmul(errors, columns.transpose(0,1), out=out)
+
+class AvgPool2d:
+    """Average pooling, a fixed (not learned) connection. Its weight tensor is empty
+
+    Args:
+        in_shape: (channels, height, width) of the lower layer
+        kernel_size: size of the (square) pooling window
+        stride: stride of the pooling window (default: kernel_size)
+    """
+    def __init__(self, in_shape, kernel_size, stride=None):
+        self.in_shape = tuple(in_shape)
+        self.kernel_size = kernel_size
+        self.stride = kernel_size if stride is None else stride
+
+        channels, height, width = self.in_shape
+        self.out_shape = (channels, output_size(height, kernel_size, self.stride, 0), output_size(width, kernel_size, self.stride, 0))
+        self.in_neurons = channels*height*width
+        self.out_neurons = channels*self.out_shape[1]*self.out_shape[2]
+        self.weight_shape = (0,)
+
+    def predict(self, w, fx):
+        return to_columns(F.avg_pool2d(to_maps(fx, self.in_shape), self.kernel_size, stride=self.stride))
+
+    def feedback(self, w, e):
+        # Each window receives the error of its output neuron, divided by the window size
+        channels = self.in_shape[0]
+        window = self.kernel_size*self.kernel_size
+        errors = e.transpose(0,1).reshape(e.shape[1], channels, 1, -1)/window
+        columns = errors.expand(-1, -1, window, -1).reshape(e.shape[1], channels*window, -1)
+        maps = F.fold(columns, self.in_shape[1:], self.kernel_size, stride=self.stride)
+        return to_columns(maps)
+
+    def gradient(self, e, fx, out):
+        return out
+
+def neurons(in_shape, connections, sizes):
+    """Returns the list of layer sizes (PcTorch `neurons` argument) of a network starting with spatial connections
+
+    Args:
+        in_shape: (channels, height, width) of the input layer
+        connections: list of spatial connections (Conv2d, AvgPool2d), applied from the input layer
+        sizes: sizes of the dense layers after the last spatial layer, including the output layer
+
+    Returns:
+        - List of layer sizes
+        - Dictionary of connections, indexed by layer (PcTorch `layers` argument)
+    """
+    layer_sizes = [in_shape[0]*in_shape[1]*in_shape[2]]
+    for connection in connections:
+        assert connection.in_neurons == layer_sizes[-1]
+        layer_sizes.append(connection.out_neurons)
+
+    return layer_sizes + list(sizes), dict(enumerate(connections))
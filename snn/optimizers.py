@@ -0,0 +1,100 @@
+import math
+import torch
+
+# Optimizers of the PcTorch weight updates
+# Parameters and optimizer variables are updated in place, with multi-tensor (torch._foreach_*) operations over all layers
+# Gradients follow the predictive coding sign convention: parameters are updated in the direction of the gradient
+
+class Optimizer:
+    """Plain gradient update: w = w + learning_rate*dw
+
+    Args:
+        learning_rate: the learning rate
+        momentum: first moment decay rate (b1)
+        b2: second moment decay rate (adam, adamw)
+        epsilon: constant added to the denominator (adam, adamw)
+        weight_decay: decoupled weight decay, applied to the weights and not to the biases (adamw)
+    """
+    def __init__(self, learning_rate, momentum=0.9, b2=0.999, epsilon=0.00000001, weight_decay=0.01):
+        self.learning_rate = learning_rate
+        self.b1 = momentum
+        self.b2 = b2
+        self.epsilon = epsilon
+        self.weight_decay = weight_decay
+        self.t = 0 # number of steps performed
+        self.state = {}
+
+    def zeros(self, name, params):
+        """Returns the optimizer variables `name`, one tensor per parameter, allocated (with zeros) on first use
+        """
+        if name not in self.state:
+            self.state[name] = [torch.zeros_like(p) for p in params]
+        return self.state[name]
+
+    def step(self, weights, biases, dw, db):
+        """Updates the weights and biases of all layers in place
+
+        Args:
+            weights: list of weight matrices
+            biases: list of bias vectors
+            dw: list of weight gradients (not modified)
+            db: list of bias gradients (not modified)
+        """
+        self.t += 1
+        self.update(weights + biases, dw + db, len(weights))
+
+    def update(self, params, grads, n_weights):
+        torch._foreach_add_(params, grads, alpha=self.learning_rate)
+
+class Sgd(Optimizer):
+    """Gradient update with momentum: v = b1*v + learning_rate*dw, w = w + v
+    """
+    def update(self, params, grads, n_weights):
+        v = self.zeros('v', params)
+        torch._foreach_mul_(v, self.b1)
+        torch._foreach_add_(v, grads, alpha=self.learning_rate)
+        torch._foreach_add_(params, v)
+
+class Nesterov(Optimizer):
+    """Gradient update with Nesterov momentum: v = b1*v + learning_rate*dw, w = w + b1*v + learning_rate*dw
+    """
+    def update(self, params, grads, n_weights):
+        v = self.zeros('v', params)
+        torch._foreach_mul_(v, self.b1)
+        torch._foreach_add_(v, grads, alpha=self.learning_rate)
+        torch._foreach_add_(params, grads, alpha=self.learning_rate)
+        torch._foreach_add_(params, v, alpha=self.b1)
+
+class Adam(Optimizer):
+    """Adam update, with bias correction
+    """
+    def update(self, params, grads, n_weights):
+        m = self.zeros('m', params)
+        v = self.zeros('v', params)
+        denominator = self.zeros('denominator', params)
+
+        torch._foreach_mul_(m, self.b1)
+        torch._foreach_add_(m, grads, alpha=1-self.b1)
+        torch._foreach_mul_(v, self.b2)
+        torch._foreach_addcmul_(v, grads, grads, value=1-self.b2)
+
+        self.decay(params, n_weights)
+
+        # Denominators in a preallocated buffer, so the gradients of the caller are not modified
+        step_size = self.learning_rate * math.sqrt(1 - self.b2**self.t) / (1 - self.b1**self.t)
+        torch._foreach_zero_(denominator)
+        torch._foreach_add_(denominator, v)
+        torch._foreach_sqrt_(denominator)
+        torch._foreach_add_(denominator, self.epsilon)
+        torch._foreach_addcdiv_(params, m, denominator, value=step_size)
+
+    def decay(self, params, n_weights):
+        pass
+
+class AdamW(Adam):
+    """Adam update with decoupled weight decay: w = w - learning_rate*weight_decay*w
+    """
+    def decay(self, params, n_weights):
+        torch._foreach_mul_(params[:n_weights], 1 - self.learning_rate*self.weight_decay)
+
+OPTIMIZERS = {'none': Optimizer, 'adam': Adam, 'sgd': Sgd, 'adamw': AdamW, 'nesterov': Nesterov}
@@ -0,0 +1,278 @@
+import torch
+
+# Relaxation solvers of the predictive coding inference (see `PcTorch.relax()`)
+# A solver updates the hidden states x[l] given the descent direction of the energy dx[l] = (w[l]^T e[l+1]) * dF(x[l]) - e[l]
+# States are updated in place, and the descent directions (workspace buffers) may be overwritten
+
+class GradientDescent:
+    """Plain gradient descent, x = x + update_rate*dx. The update rate is halved when more than 1 sample error increases (same rule as `PcTorch.inference()`)
+
+    Args:
+        update_rate: initial inference rate
+    """
+    layerwise = True # steps of each layer are independent, so the layers can be updated in any order (see `PcTorch.update_order`)
+    device_feedback = True # adapts without reading values on the host (see `PcTorch.sync_free_inference`)
+
+    def __init__(self, update_rate):
+        self.initial_update_rate = update_rate
+        self.reset()
+
+    def reset(self, update_rate=None, like=None):
+        """Prepares the solver for a new batch
+
+        Args:
+            update_rate: initial inference rate (default: the rate of the previous batch)
+            like: if given, the update rate is kept as a 0-dim tensor with the dtype and device of this tensor, and adapted on the device
+        """
+        if update_rate is not None:
+            self.initial_update_rate = update_rate
+
+        self.update_rate = self.initial_update_rate
+        if like is not None:
+            self.update_rate = torch.tensor(self.update_rate, dtype=like.dtype, device=like.device)
+            self.half = torch.tensor(0.5, dtype=like.dtype, device=like.device)
+            self.one = torch.tensor(1, device=like.device)
+            self.halved_rate = torch.empty_like(self.update_rate)
+            self.halve = torch.empty((), dtype=torch.bool, device=like.device)
+        self.restart()
+
+    def restart(self):
+        """Clears the solver history (called when the update rate or the weights change)
+        """
+        pass
+
+    def step(self, x, dx):
+        """Updates the hidden states in place
+
+        Args:
+            x: neuron activations for each layer (batch form)
+            dx: descent direction for the hidden layers updated (batch form)
+        """
+        for l in dx:
+            if torch.is_tensor(self.update_rate):
+                x[l].add_(dx[l].mul_(self.update_rate))
+            else:
+                x[l].add_(dx[l], alpha=self.update_rate)
+
+    def feedback(self, increased, count, previous_error, current_error):
+        """Adapts the solver after an iteration
+
+        Args:
+            increased: boolean tensor, samples whose error increased
+            count: 0-dim tensor, number of samples whose error increased
+            previous_error: dictionary with the per-sample error (sum of squares) of each layer, before the iteration (None with compiled iterations)
+            current_error: same, after the iteration
+        """
+        if torch.is_tensor(self.update_rate):
+            # In place, with the buffers of `reset()` (python scalar operands are allocated as tensors)
+            torch.gt(count, self.one, out=self.halve)
+            torch.mul(self.update_rate, self.half, out=self.halved_rate)
+            torch.where(self.halve, self.halved_rate, self.update_rate, out=self.update_rate)
+        elif count.item() > 1:
+            self.update_rate = self.update_rate/2
+            self.restart()
+
+    def compact(self, keep):
+        """Removes the samples (columns) that are not in `keep` (boolean tensor) from the solver history, see `PcTorch.per_sample_convergence`
+        """
+        pass
+
+class Momentum(GradientDescent):
+    """Heavy-ball momentum, v = momentum*v + update_rate*dx, x = x + v. With `nesterov`, x = x + momentum*v + update_rate*dx
+    
+    Args:
+        update_rate: initial inference rate
+        momentum: momentum factor
+        nesterov: use Nesterov momentum
+    """
+    device_feedback = False
+
+    def __init__(self, update_rate, momentum=0.9, nesterov=False):
+        self.momentum = momentum
+        self.nesterov = nesterov
+        super().__init__(update_rate)
+
+    def reset(self, update_rate=None, like=None):
+        self.velocity = {}
+        super().reset(update_rate, like)
+
+    def restart(self):
+        for velocity in self.velocity.values():
+            velocity.zero_()
+
+    def step(self, x, dx):
+        for l in dx:
+            if l not in self.velocity:
+                self.velocity[l] = torch.zeros_like(dx[l])
+                self.momentum_factor = torch.tensor(self.momentum, dtype=dx[l].dtype, device=dx[l].device) # python scalar operands are allocated as tensors
+
+            velocity = self.velocity[l]
+            velocity.mul_(self.momentum_factor).add_(dx[l], alpha=self.update_rate)
+            if self.nesterov:
+                x[l].add_(velocity, alpha=self.momentum).add_(dx[l], alpha=self.update_rate)
+            else:
+                x[l].add_(velocity)
+
+    def compact(self, keep):
+        self.velocity = {l:v[:, keep] for l, v in self.velocity.items()}
+
+class Anderson(GradientDescent):
+    """Anderson acceleration of the gradient descent fixed-point map G(x) = x + update_rate*dx. The hidden layers of each sample are concatenated into a single vector, and each sample is accelerated independently with the last `memory` iterates
+
+    Args:
+        update_rate: initial inference rate
+        memory: number of previous iterates used
+        regularization: relative Tikhonov regularization of the least squares problem
+    """
+    layerwise = False
+    device_feedback = False
+
+    def __init__(self, update_rate, memory=5, regularization=0.0000000001):
+        self.memory = memory
+        self.regularization = regularization
+        super().__init__(update_rate)
+
+    def restart(self):
+        self.dX = []
+        self.dF = []
+        self.previous_x = None
+        self.previous_f = None
+
+    def step(self, x, dx):
+        layers = sorted(dx)
+        xk = torch.cat([x[l] for l in layers], 0) # [neurons, batch_size]
+        fk = self.update_rate*torch.cat([dx[l] for l in layers], 0)
+
+        if self.previous_x is not None:
+            self.dX.append(xk - self.previous_x)
+            self.dF.append(fk - self.previous_f)
+            if len(self.dX) > self.memory:
+                self.dX.pop(0)
+                self.dF.pop(0)
+
+        self.previous_x = xk
+        self.previous_f = fk
+
+        new_x = xk + fk
+        if len(self.dX) > 0:
+            # Batched least squares, one [m x m] system per sample
+            dX = torch.stack(self.dX, 2).permute(1, 0, 2) # [batch_size, neurons, m]
+            dF = torch.stack(self.dF, 2).permute(1, 0, 2)
+            A = torch.matmul(dF.transpose(1, 2), dF)
+            scale = A.diagonal(dim1=1, dim2=2).mean(1).view(-1, 1, 1) + 1e-30
+            A = A + self.regularization*scale*torch.eye(A.shape[1], dtype=A.dtype, device=A.device)
+            rhs = torch.matmul(dF.transpose(1, 2), fk.t().unsqueeze(2))
+            gamma = torch.linalg.solve(A, rhs)
+            new_x = new_x - torch.matmul(dX + dF, gamma).squeeze(2).t()
+
+        start = 0
+        for l in layers:
+            end = start + x[l].shape[0]
+            x[l].copy_(new_x[start:end])
+            start = end
+
+    def compact(self, keep):
+        self.dX = [d[:, keep] for d in self.dX]
+        self.dF = [d[:, keep] for d in self.dF]
+        if self.previous_x is not None:
+            self.previous_x = self.previous_x[:, keep]
+            self.previous_f = self.previous_f[:, keep]
+
+class AdaptiveStep(GradientDescent):
+    """Gradient descent with a separate update rate for each hidden layer. The rate of a layer grows while the energy around it (errors of the layer and of the layer above) decreases, and shrinks when it increases
+
+    Args:
+        update_rate: initial inference rate of every layer
+        grow: factor applied to the rate of a layer when its energy decreases
+        shrink: factor applied to the rate of a layer when its energy increases
+        max_update_rate: upper bound of the rates
+    """
+    device_feedback = False
+
+    def __init__(self, update_rate, grow=1.2, shrink=0.5, max_update_rate=1.0):
+        self.grow = grow
+        self.shrink = shrink
+        self.max_update_rate = max_update_rate
+        super().__init__(update_rate)
+
+    def restart(self):
+        self.layer_rates = {}
+        self.error_sums = None
+
+    def step(self, x, dx):
+        for l in dx:
+            rate = self.layer_rates.setdefault(l, self.update_rate)
+            x[l].add_(dx[l], alpha=rate)
+
+    def feedback(self, increased, count, previous_error, current_error):
+        # Errors of each layer (summed over the samples) before and after the iteration, read with a single copy to the host
+        layers = sorted(current_error)
+        if self.error_sums is None:
+            any_error = current_error[layers[0]]
+            self.error_sums = torch.empty(2, len(layers), dtype=any_error.dtype, device=any_error.device)
+        for i, l in enumerate(layers):
+            torch.sum(previous_error[l], 0, out=self.error_sums[0, i])
+            torch.sum(current_error[l], 0, out=self.error_sums[1, i])
+        previous_sums, current_sums = (dict(zip(layers, sums)) for sums in self.error_sums.tolist())
+
+        # All hidden layers, including the layers without a step yet (skipped by the error wavefront)
+        for l in layers:
+            if l+1 not in current_error:
+                continue
+            self.layer_rates.setdefault(l, self.update_rate)
+            previous = previous_sums[l] + previous_sums[l+1]
+            current = current_sums[l] + current_sums[l+1]
+            if current > previous:
+                self.layer_rates[l] *= self.shrink
+            else:
+                self.layer_rates[l] = min(self.layer_rates[l]*self.grow, self.max_update_rate)
+
+class PerSampleStep(GradientDescent):
+    """Gradient descent with a separate update rate for each sample (column) of the batch. The rate of a sample grows while its error decreases, and shrinks when it increases, so unstable samples do not slow down the others
+
+    Args:
+        update_rate: initial inference rate of every sample
+        grow: factor applied to the rate of a sample when its error decreases
+        shrink: factor applied to the rate of a sample when its error increases
+        max_update_rate: upper bound of the rates
+    """
+    def __init__(self, update_rate, grow=1.2, shrink=0.5, max_update_rate=1.0):
+        self.grow = grow
+        self.shrink = shrink
+        self.max_update_rate = max_update_rate
+        super().__init__(update_rate)
+
+    def restart(self):
+        self.sample_rates = None
+        self.shrunk_rates = None
+
+    def step(self, x, dx):
+        if self.sample_rates is None:
+            any_dx = next(iter(dx.values()))
+            self.sample_rates = torch.full((any_dx.shape[1],), float(self.initial_update_rate), dtype=any_dx.dtype, device=any_dx.device)
+            self.shrunk_rates = torch.empty_like(self.sample_rates)
+            self.factors = torch.tensor([self.shrink, self.grow], dtype=any_dx.dtype, device=any_dx.device) # python scalar operands are allocated as tensors
+
+        for l in dx:
+            x[l].addcmul_(dx[l], self.sample_rates)
+
+    def feedback(self, increased, count, previous_error, current_error):
+        if self.sample_rates is None:
+            return
+        torch.mul(self.sample_rates, self.factors[0], out=self.shrunk_rates)
+        self.sample_rates.mul_(self.factors[1]).clamp_(max=self.max_update_rate)
+        torch.where(increased, self.shrunk_rates, self.sample_rates, out=self.sample_rates)
+
+    def compact(self, keep):
+        if self.sample_rates is not None:
+            self.sample_rates = self.sample_rates[keep]
+            self.shrunk_rates = self.shrunk_rates[keep]
+
+SOLVERS = {
+    'gd': GradientDescent,
+    'momentum': Momentum,
+    'nesterov': lambda update_rate: Momentum(update_rate, nesterov=True),
+    'anderson': Anderson,
+    'adaptive': AdaptiveStep,
+    'per_sample': PerSampleStep
+}
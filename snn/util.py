@@ -23,18 +23,70 @@ def clear():
     else: 
         _ = system('clear') 
 
-def dRelu(x):
-    return torch.gt(x, torch.zeros(x.shape, device=x.device)).type(x.type())
+# Activation functions and derivatives. If `out` is given, the result is written into it without allocating a new tensor
+def Relu(x, out=None):
+    return torch.clamp(x, min=0, out=out)
 
-def dLinear(x):
-    return torch.ones(x.shape).type(x.type())
+def Sigmoid(x, out=None):
+    return torch.sigmoid(x, out=out)
 
-def dSigmoid(x):
-    sig_x = torch.nn.Sigmoid()(x)
-    return sig_x*(1 - sig_x)
+def dRelu(x, out=None):
+    if out is None:
+        return torch.gt(x, 0).type(x.type())
+    return torch.gt(x, 0, out=out)
 
-def Linear(x):
-    return x
+def dLinear(x, out=None):
+    if out is None:
+        return torch.ones_like(x)
+    return out.fill_(1)
+
+def dSigmoid(x, out=None):
+    if out is None:
+        sig_x = torch.sigmoid(x)
+        return sig_x*(1 - sig_x)
+    torch.sigmoid(x, out=out)
+    return out.addcmul_(out, out, value=-1) # sig_x - sig_x^2
+
+def Linear(x, out=None):
+    if out is None:
+        return x
+    return out.copy_(x)
+
+# Activation functions computed together with their derivatives, sharing the intermediate values
+# (the ReLU mask, the sigmoid output). If `out`/`dout` are given, F(x)/dF(x) are written into them
+def ReluAndDerivative(x, out=None, dout=None):
+    dout = dRelu(x, out=dout)
+    if out is None:
+        return x*dout, dout
+    return torch.mul(x, dout, out=out), dout
+
+def SigmoidAndDerivative(x, out=None, dout=None):
+    out = torch.sigmoid(x, out=out)
+    if dout is None:
+        return out, out*(1 - out)
+    torch.mul(out, out, out=dout)
+    return out, dout.neg_().add_(out) # sig_x - sig_x^2
+
+def LinearAndDerivative(x, out=None, dout=None):
+    return Linear(x, out=out), dLinear(x, out=dout)
+
+def count_allocations(function):
+    """Counts the (CPU) tensor memory allocations performed by a call of `function` (called without arguments), using the pytorch profiler
+
+    Returns:
+        - The number of allocations
+        - The return value of `function`
+    """
+    with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True) as profiler:
+        result = function()
+
+    # Raw events: `profiler.events()` merges the allocations of an operator into the operator event, and only keeps the other memory events
+    allocations = 0
+    for event in profiler.profiler.kineto_results.events():
+        if event.name() == '[memory]' and event.nbytes() > 0:
+            allocations += 1
+
+    return allocations, result
 
 # Pre processing functions to make algorithm stable
 def preLinear(x):
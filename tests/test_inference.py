@@ -0,0 +1,82 @@
+# Inference settings running through the shared relaxation loop (see `PcTorch.relax()`)
+# Run from the root folder: python -m pytest tests
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+
+BATCH_SIZE = 16
+MAX_IT = 30
+BATCHES = 3
+NEURONS = [20, 12, 12, 12, 4]
+
+def train(settings, attributes={}, batch_size=BATCH_SIZE):
+    """Trains a few batches from a fixed initialisation, returns the network
+    """
+    torch.manual_seed(0)
+    pc_model = PcTorch(NEURONS)
+    pc_model.set_training_parameters(batch_size, MAX_IT, 'sigmoid', 'sgd', 0.01, 0.9, **settings)
+    for name, value in attributes.items():
+        setattr(pc_model, name, value)
+
+    data = torch.sigmoid(torch.randn(batch_size, NEURONS[0]))
+    labels = F.one_hot(torch.randint(0, NEURONS[-1], (batch_size,)), num_classes=NEURONS[-1])
+    for i in range(BATCHES):
+        pc_model.single_batch_pass(data, labels)
+    return pc_model
+
+def max_difference(model_a, model_b):
+    return max(torch.max(torch.abs(model_a.w[l] - model_b.w[l])).item() for l in model_a.w)
+
+# Hooks that do not change the result of the default gradient descent
+@pytest.mark.parametrize('settings', [
+    {'stacked_inference': True},
+    {'sync_free_inference': True, 'convergence_check_interval': 1},
+    {'inference_backend': 'torchscript'},
+])
+def test_equivalent_settings(settings):
+    default = train({})
+    model = train(settings)
+    assert model.relaxation_settings()[1] == []
+    assert model.inference_steps == default.inference_steps
+    assert max_difference(model, default) < 1e-5
+
+# Settings that used to run in separate loops, and can now be combined
+@pytest.mark.parametrize('settings', [
+    {'update_order': 'gauss_seidel_up', 'solver': 'momentum'},
+    {'update_order': 'red_black', 'solver': 'adaptive'},
+    {'stacked_inference': True, 'per_sample_convergence': True},
+    {'incremental_update_interval': 5, 'per_sample_convergence': True},
+    {'incremental_update_interval': 5, 'sync_free_inference': True},
+    {'inference_backend': 'torchscript', 'per_sample_convergence': True},
+    {'solver': 'nesterov', 'residual_tolerance': 1e-3},
+])
+def test_combined_settings(settings):
+    model = train(settings, {'min_inference_error': 1e-4})
+    assert model.relaxation_settings()[1] == []
+    assert 0 < model.inference_steps <= MAX_IT
+    assert all(torch.all(torch.isfinite(model.w[l])) for l in model.w)
+
+# Per-sample iteration counts (`per_sample_convergence`) include the iteration where a sample converged, as `inference_steps`
+@pytest.mark.parametrize('min_inference_error', [1e-5, 0.0])
+def test_per_sample_iterations(min_inference_error):
+    model = train({'per_sample_convergence': True}, {'min_inference_error': min_inference_error})
+    iterations = model.inference_iterations
+    assert torch.all(iterations >= 1)
+    assert iterations.max().item() == model.inference_steps
+    assert model.iterations_histogram.sum().item() == BATCH_SIZE
+    assert model.iterations_histogram[model.inference_steps].item() == torch.sum(iterations == model.inference_steps).item()
+    if min_inference_error == 0.0:
+        assert torch.all(iterations == MAX_IT)
+
+def test_per_sample_single_sample():
+    # With a single sample, the per-sample criterion is the mean criterion of the default inference
+    default = train({}, {'min_inference_error': 1e-6}, batch_size=1)
+    model = train({'per_sample_convergence': True}, {'min_inference_error': 1e-6}, batch_size=1)
+    assert model.inference_iterations.tolist() == [default.inference_steps]
+    assert model.inference_steps == default.inference_steps
+    assert max_difference(model, default) < 1e-6
@@ -0,0 +1,45 @@
+# Micro-batching inference server (see `snn/InferenceServer.py`)
+# Run from the root folder: python -m pytest tests
+
+import asyncio
+import torch
+
+import sys
+sys.path.append('.')
+from snn.InferenceServer import InferenceServer
+
+class Doubler:
+    """Stand-in model: the output of each sample is its features times 2
+    """
+    def batch_inference(self, data):
+        return 2*data.t()
+
+def test_predict_and_stop():
+    async def run():
+        server = InferenceServer(Doubler(), max_batch_size=4)
+        await server.start()
+        features = [torch.full((3,), float(i)) for i in range(10)]
+        outputs = await asyncio.gather(*[server.predict(f) for f in features])
+        await server.stop()
+        return server, features, outputs
+
+    server, features, outputs = asyncio.run(run())
+    assert all(torch.equal(output, 2*f) for output, f in zip(outputs, features))
+    assert server.requests == 10
+    assert server.worker is None and server.queue is None and server.executor is None
+
+def test_stop_is_idempotent():
+    async def run():
+        server = InferenceServer(Doubler())
+        await server.stop() # not started
+        await server.start()
+        await asyncio.gather(server.stop(), server.stop())
+        await server.stop()
+
+        # Can be started again
+        await server.start()
+        output = await server.predict(torch.ones(2))
+        await server.stop()
+        return output
+
+    assert torch.equal(asyncio.run(run()), 2*torch.ones(2))
@@ -0,0 +1,43 @@
+# Closed-form inference of linear-activation networks (see `PcTorch.inference_linear_equilibrium()`)
+# Run from the root folder: python -m pytest tests
+
+import pytest
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+
+BATCH_SIZE = 8
+ITERATIVE_STEPS = 20000
+TOLERANCE = 0.00001
+
+def relax(pc_model, data, targets):
+    x = pc_model.feedforward(data)
+    x[pc_model.n_layers-1] = targets
+    x, e = pc_model.inference(x)
+    return {l:torch.clone(x[l]) for l in x}
+
+@pytest.mark.parametrize('neurons', [[20, 16, 16, 16, 5], [20, 16, 12, 8, 5]])
+@pytest.mark.parametrize('solver', ['direct', 'cg'])
+def test_closed_form_matches_iterative(neurons, solver):
+    torch.manual_seed(0)
+    pc_model = PcTorch(neurons, precision='float64')
+    pc_model.set_training_parameters(BATCH_SIZE, ITERATIVE_STEPS, 'linear', 'none', 0.001, 0.9)
+
+    data = torch.rand(neurons[0], BATCH_SIZE, dtype=pc_model.compute_dtype).to(PcTorch.device)
+    targets = torch.rand(neurons[-1], BATCH_SIZE, dtype=pc_model.compute_dtype).to(PcTorch.device)
+
+    # Iterative reference, run to convergence
+    pc_model.closed_form_linear = False
+    pc_model.min_inference_error = 1e-20
+    x_iterative = relax(pc_model, data, targets)
+
+    pc_model.closed_form_linear = True
+    pc_model.direct_solver_max_neurons = sum(neurons) if solver == 'direct' else 0
+    x_closed = relax(pc_model, data, targets)
+
+    assert pc_model.inference_steps == 1
+    for l in range(1, len(neurons)-1):
+        assert x_closed[l].shape == (neurons[l], BATCH_SIZE)
+        assert torch.max(torch.abs(x_closed[l] - x_iterative[l])).item() < TOLERANCE
@@ -0,0 +1,40 @@
+# Adaptive inference iteration budget (see `PcTorch.set_max_it_controller()`)
+# Run from the root folder: python -m pytest tests
+
+import numpy as np
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+
+NEURONS = [8, 6, 3]
+SAMPLES = 32
+
+def dataset():
+    generator = np.random.default_rng(0)
+    data = [generator.uniform(0.1, 0.9, NEURONS[0]) for i in range(SAMPLES)]
+    labels = [np.eye(NEURONS[-1])[generator.integers(NEURONS[-1])] for i in range(SAMPLES)]
+    return data, labels
+
+def test_train_clamps_the_budget():
+    torch.manual_seed(0)
+    pc_model = PcTorch(NEURONS)
+    pc_model.set_training_parameters(8, 10, 'sigmoid')
+    pc_model.set_max_it_controller(min_it=5, max_it=20, interval=1000)
+    pc_model.min_inference_error = 0 # always use the whole budget
+
+    data, labels = dataset()
+    pc_model.train(data, labels, list(data), list(labels), batch_size=8, max_it=100, activation='sigmoid')
+
+    assert pc_model.max_it == 20
+    assert pc_model.inference_steps == 20
+    assert pc_model.max_it_controller.budget == 20
+    assert pc_model.max_it_controller.steps == [20]*(SAMPLES//8)
+
+def test_training_parameters_clamp_the_budget():
+    pc_model = PcTorch(NEURONS)
+    pc_model.set_training_parameters(8, 10, 'sigmoid')
+    pc_model.set_max_it_controller(min_it=5, max_it=20)
+    pc_model.set_training_parameters(8, 2, 'sigmoid')
+    assert pc_model.max_it == 5
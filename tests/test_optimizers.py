@@ -0,0 +1,35 @@
+# Optimizers of the weight updates (see `snn/optimizers.py`)
+# Run from the root folder: python -m pytest tests
+
+import pytest
+import torch
+
+import sys
+sys.path.append('.')
+from snn import optimizers
+
+@pytest.mark.parametrize('name', list(optimizers.OPTIMIZERS))
+def test_gradients_are_not_modified(name):
+    torch.manual_seed(0)
+    weights = [torch.randn(6, 4), torch.randn(3, 6)]
+    biases = [torch.randn(6, 1), torch.randn(3, 1)]
+    dw = [torch.randn_like(w) for w in weights]
+    db = [torch.randn_like(b) for b in biases]
+    saved = [torch.clone(g) for g in dw + db]
+
+    optimizer = optimizers.OPTIMIZERS[name](0.01)
+    for i in range(3):
+        optimizer.step(weights, biases, dw, db)
+
+    assert all(torch.equal(g, s) for g, s in zip(dw + db, saved))
+
+def test_adam_step():
+    # First step of adam with bias correction: w = w + learning_rate*dw/(|dw| + epsilon)
+    weights = [torch.zeros(2, 2)]
+    biases = [torch.zeros(2, 1)]
+    dw = [torch.tensor([[1.0, -2.0], [0.5, 0.0]])]
+    db = [torch.tensor([[3.0], [-1.0]])]
+
+    optimizers.Adam(0.1).step(weights, biases, dw, db)
+    assert torch.allclose(weights[0], 0.1*torch.sign(dw[0]), atol=1e-6)
+    assert torch.allclose(biases[0], 0.1*torch.sign(db[0]), atol=1e-6)
@@ -0,0 +1,35 @@
+# Weight updates with the bfloat16 storage precision (float32 master weights, see `PcTorch.update_weights()`)
+# Run from the root folder: python -m pytest tests
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+
+BATCH_SIZE = 16
+LEARNING_RATE = 0.0001
+BATCHES = 20
+
+@pytest.mark.parametrize('optimizer', ['adam', 'adamw'])
+def test_small_updates_accumulate(optimizer):
+    torch.manual_seed(0)
+    neurons = [32, 16, 16, 4]
+    pc_model = PcTorch(neurons, precision='bfloat16')
+    pc_model.set_training_parameters(BATCH_SIZE, 10, 'sigmoid', optimizer, LEARNING_RATE, 0.9)
+
+    data = torch.sigmoid(torch.randn(BATCH_SIZE, neurons[0]))
+    labels = F.one_hot(torch.randint(0, neurons[-1], (BATCH_SIZE,)), num_classes=neurons[-1])
+
+    initial = {l:torch.clone(pc_model.w[l]) for l in pc_model.w}
+    for i in range(BATCHES):
+        pc_model.single_batch_pass(data, labels)
+
+    # The optimizer works on float32 master weights: small updates are not rounded away by the bfloat16 storage
+    assert all(pc_model.w[l].dtype == torch.bfloat16 for l in pc_model.w)
+    assert all(master.dtype == torch.float32 for master in pc_model.master_weights)
+    changed = sum(torch.count_nonzero(pc_model.w[l] != initial[l]).item() for l in pc_model.w)
+    total = sum(pc_model.w[l].numel() for l in pc_model.w)
+    assert changed > 0.5*total
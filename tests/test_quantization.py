@@ -0,0 +1,38 @@
+# Int8 quantisation of a trained network (see `snn/QuantizedPcTorch.py`)
+# Run from the root folder: python -m pytest tests
+
+import pytest
+import torch
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+from snn.QuantizedPcTorch import QuantizedPcTorch
+
+NEURONS = [64, 32, 32, 10]
+
+def test_qparams_range():
+    scale, zero_point = QuantizedPcTorch.qparams(-1.0, 3.0, 127)
+    assert zero_point == round(1.0/scale)
+    assert round((3.0 - -1.0)/scale) == 127
+
+@pytest.mark.parametrize('engine', [engine for engine in ['x86', 'fbgemm', 'qnnpack'] if engine in torch.backends.quantized.supported_engines])
+@pytest.mark.parametrize('calibrated', [True, False])
+def test_quantized_output(engine, calibrated):
+    torch.manual_seed(0)
+    pc_model = PcTorch(NEURONS, precision='float32')
+    pc_model.set_training_parameters(16, 10, 'sigmoid')
+    data = torch.rand(128, NEURONS[0])*0.8 + 0.1
+    expected = pc_model.batch_inference(data)
+
+    previous = torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    try:
+        quantized = QuantizedPcTorch(pc_model, data if calibrated else None)
+        output = quantized.batch_inference(data)
+    finally:
+        torch.backends.quantized.engine = previous
+
+    # fbgemm/x86 quantise the inputs of the products to 7 bits
+    assert quantized.quant_max == (127 if engine in ['x86', 'fbgemm'] else 255)
+    assert torch.max(torch.abs(output - expected)).item() < 0.05*torch.max(torch.abs(expected)).item()
@@ -0,0 +1,39 @@
+# Warm start state cache (see `snn/StateCache.py`)
+# Run from the root folder: python -m pytest tests
+
+import numpy as np
+import torch
+
+import sys
+sys.path.append('.')
+from snn.StateCache import StateCache
+
+NEURONS = [6, 4, 3, 2]
+
+def states(batch_size, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return {l:torch.randn(NEURONS[l], batch_size, generator=generator) for l in range(len(NEURONS))}
+
+def test_index_types():
+    cache = StateCache(NEURONS, 8, precision='float32')
+    x = states(3)
+    cache.put([0, 1, 2], x)
+
+    # numpy and torch integers find the same samples
+    y = states(3, seed=1)
+    assert cache.get(np.arange(3), y) == 3
+    assert cache.get(torch.arange(3), states(3, seed=2)) == 3
+    assert all(torch.equal(y[l], x[l]) for l in range(1, len(NEURONS)-1))
+
+def test_batch_larger_than_cache():
+    cache = StateCache(NEURONS, 4, precision='float32')
+    x = states(6)
+    cache.put(range(6), x)
+    assert len(cache) == 4
+
+    # The last samples of the batch are stored, each in its own row
+    y = states(6, seed=1)
+    assert cache.get(range(6), y) == 4
+    for l in range(1, len(NEURONS)-1):
+        assert torch.equal(y[l][:, 2:], x[l][:, 2:])
+        assert not torch.equal(y[l][:, :2], x[l][:, :2])
@@ -0,0 +1,65 @@
+# Workspace buffers of the inference (see `PcTorch.get_workspace()`)
+# Run from the root folder: python -m pytest tests
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+import sys
+sys.path.append('.')
+from snn.PcTorch import PcTorch
+from snn import util
+
+BATCH_SIZE = 16
+NEURONS = [20, 12, 12, 12, 4]
+
+def network(max_it=10, **settings):
+    torch.manual_seed(0)
+    pc_model = PcTorch(NEURONS)
+    pc_model.set_training_parameters(BATCH_SIZE, max_it, 'sigmoid', 'adam', 0.001, 0.9, **settings)
+    pc_model.min_inference_error = 0 # always run max_it iterations
+    return pc_model
+
+def batch(batch_size=BATCH_SIZE):
+    data = torch.sigmoid(torch.randn(batch_size, NEURONS[0]))
+    labels = F.one_hot(torch.randint(0, NEURONS[-1], (batch_size,)), num_classes=NEURONS[-1])
+    return data, labels
+
+def states(pc_model, data, labels):
+    x = pc_model.feedforward(pc_model.preprocessing(data.to(pc_model.compute_dtype).t()))
+    x[pc_model.n_layers-1] = labels.t().to(pc_model.compute_dtype)
+    return x
+
+@pytest.mark.parametrize('settings', [{}, {'update_order': 'red_black'}, {'solver': 'momentum'}, {'sync_free_inference': True}, {'per_sample_convergence': True}])
+def test_iterations_do_not_allocate(settings):
+    data, labels = batch()
+    allocations = []
+    for max_it in [5, 20]:
+        pc_model = network(max_it, **settings)
+        pc_model.single_batch_pass(data, labels) # creates the workspace
+        x = states(pc_model, data, labels)
+        count, _ = util.count_allocations(lambda: pc_model.inference(x, copy=False))
+        allocations.append(count)
+
+    assert allocations[0] == allocations[1]
+
+def test_workspaces_are_capped():
+    pc_model = network()
+    for batch_size in [16, 8, 4, 8]:
+        pc_model.single_batch_pass(*batch(batch_size))
+
+    assert len(pc_model.workspaces) == pc_model.max_workspaces
+    assert [key[0] for key in pc_model.workspaces] == [4, 8]
+
+def test_inference_returns_copies():
+    pc_model = network()
+    data, labels = batch()
+    x, e = pc_model.inference(states(pc_model, data, labels))
+    ws = pc_model.get_workspace(BATCH_SIZE)
+    assert all(x[l].data_ptr() != ws['x'][l].data_ptr() for l in ws['x'])
+    assert all(e[l].data_ptr() != ws['e'][l].data_ptr() for l in ws['e'])
+
+    # The copies are not overwritten by the next inference
+    saved = {l:torch.clone(e[l]) for l in e}
+    pc_model.inference(states(pc_model, *batch()))
+    assert all(torch.equal(e[l], saved[l]) for l in e)